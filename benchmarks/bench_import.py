@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "import_baseline.json")
+
+# every entry point a short-lived worker or script starts from; none of them may load the
+# image or plotting libraries at import time, they are imported on first use instead
+ENTRY_POINTS = [
+    "phase0.FA_class",
+    "phase0.fa_binary",
+    "phase1.module1",
+    "phase1.lossy",
+    "phase2.module2",
+    "phase3.module3",
+    "phase4.module4",
+    "visualization.visualizer",
+    "server.worker",
+    "cli",
+]
+HEAVY = ("cv2", "matplotlib", "networkx")
+
+
+def import_time(module: str) -> tuple[float, dict[str, float]]:
+    # one cold interpreter running `import module` under -X importtime: the cumulative
+    # seconds of the module and the cumulative seconds of every module it imported
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                             env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr}")
+    imported = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported[name.strip()] = int(cumulative) / 1e6
+    return imported[module], imported
+
+
+def measure(module: str, repeat: int) -> dict:
+    # the best of `repeat` cold starts, and the heaviest first-party and third-party imports
+    seconds = float("inf")
+    imported = {}
+    for _ in range(repeat):
+        total, modules = import_time(module)
+        if total < seconds:
+            seconds, imported = total, modules
+    top = sorted(((name, value) for name, value in imported.items() if "." not in name and name != module),
+                 key=lambda item: -item[1])[:3]
+    return {"module": module, "seconds": seconds, "heavy": [name for name in HEAVY if name in imported],
+            "top": top}
+
+
+def run(modules: list[str], repeat: int = 5, log=sys.stdout) -> dict:
+    results = []
+    for module in modules:
+        result = measure(module, repeat)
+        results.append(result)
+        top = "  ".join(f"{name} {value * 1000:.0f} ms" for name, value in result["top"])
+        heavy = f"  LOADS {','.join(result['heavy'])}" if result["heavy"] else ""
+        print(f"{module:<26} {result['seconds'] * 1000:8.1f} ms   {top}{heavy}", file=log, flush=True)
+    return {"python": sys.version.split()[0], "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float = 1.5, noise: float = 0.02) -> list[str]:
+    # an entry point regresses when it loads a heavy library, or starts `threshold` times
+    # (and `noise` seconds) slower than the baseline
+    old = {result["module"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        if result["heavy"]:
+            regressions.append(f"{result['module']}: imports {', '.join(result['heavy'])} at load")
+        before = old.get(result["module"])
+        if before is None:
+            continue
+        if result["seconds"] > before["seconds"] * threshold and result["seconds"] - before["seconds"] > noise:
+            regressions.append(f"{result['module']}: {before['seconds'] * 1000:.1f} ms -> "
+                               f"{result['seconds'] * 1000:.1f} ms")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="cold-start import time of every entry point")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="report to compare against, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="store this report as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    report = run(args.modules, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=1)
+        return 0
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+    regressions = compare(report, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions" + (f" against {args.baseline}" if baseline else ""))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
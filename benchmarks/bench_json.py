@@ -0,0 +1,35 @@
+import glob
+import io
+import os
+import time
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA
+from phase1 import module1
+
+
+def timed(function, *args) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run(data_directory: str = "data/module3Test", synthetic_resolution: int = 1024) -> None:
+    texts = {}
+    for path in sorted(glob.glob(os.path.join(data_directory, "*.json"))):
+        with open(path, 'r') as file:
+            texts[os.path.basename(path)] = file.read()
+    image = (np.random.default_rng(0).random((synthetic_resolution, synthetic_resolution)) < 0.5).astype(np.uint8)
+    texts[f"random {synthetic_resolution}"] = module1.solve(image).serialize_json()
+
+    for name, text in texts.items():
+        fa, load = timed(DFA.deserialize_json, text)
+        _, stream = timed(DFA.load_json, io.StringIO(text))
+        _, compact = timed(CompactDFA.deserialize_json, text)
+        _, dump = timed(fa.serialize_json)
+        print(f"{name:<12} {len(fa.states):>7} states  deserialize {load * 1000:8.1f} ms  "
+              f"load_json {stream * 1000:8.1f} ms  compact {compact * 1000:8.1f} ms  "
+              f"serialize {dump * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,33 @@
+import glob
+import os
+import time
+import numpy as np
+from phase0.FA_class import CompactDFA
+from phase1.lossy import solve_lossy
+from phase3 import module3
+from utils import utils
+
+
+def run(data_directory: str = "data/module3Test", resolutions: tuple[int, ...] = (128,),
+        tolerances: tuple[float, ...] = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2)) -> None:
+    # state count and pixel error of the lossy image automata against phase3 accuracy: the
+    # approximated pictures are classified against the library, image i should match FA i
+    # (the library is drawn for 128x128 pictures)
+    fa_list = [CompactDFA.load_json(path) for path in sorted(glob.glob(os.path.join(data_directory, "*.json")))]
+    for res in resolutions:
+        _, images = utils.load_binary_images(data_directory, res)
+        for tolerance in tolerances:
+            start = time.perf_counter()
+            approximations = [solve_lossy(image, tolerance) for image in images]
+            elapsed = time.perf_counter() - start
+            best = module3.classify(fa_list, [approximation.image for approximation in approximations],
+                                    workers=None).best
+            accuracy = np.mean([i == j for i, j in enumerate(best)])
+            states = sum(approximation.states for approximation in approximations)
+            error = np.mean([approximation.error_rate for approximation in approximations])
+            print(f"{res:>5} tolerance {tolerance:<6} {states:>7} states  error {error * 100:6.2f}%  "
+                  f"accuracy {accuracy * 100:5.1f}%  {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,26 @@
+import time
+import numpy as np
+from phase1 import module1
+
+
+def make_images(res: int, seed: int = 0) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    rows, cols = np.indices((res, res))
+    return {
+        "random": (rng.random((res, res)) < 0.5).astype(np.uint8),
+        "sparse": (rng.random((res, res)) < 0.01).astype(np.uint8),
+        "checkerboard": ((rows // 8 + cols // 8) % 2).astype(np.uint8),
+    }
+
+
+def run(resolutions: tuple[int, ...] = (64, 512, 4096)) -> None:
+    for res in resolutions:
+        for name, image in make_images(res).items():
+            start = time.perf_counter()
+            fa = module1.solve(image)
+            elapsed = time.perf_counter() - start
+            print(f"{res:>5} {name:<12} {len(fa.states):>9} states {elapsed * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
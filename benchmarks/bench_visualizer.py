@@ -0,0 +1,29 @@
+import io
+import sys
+import time
+from phase1 import module1
+from visualization import visualizer
+from benchmarks.bench_module1 import make_images
+
+
+def run(resolutions: tuple[int, ...] = (64, 512, 1024), limit: float = 5.0) -> int:
+    # headless DOT and SVG output for automata of up to tens of thousands of states; a
+    # 512x512 random picture (over 10k states) has to render in under `limit` seconds
+    slow = 0
+    for res in resolutions:
+        for name, image in make_images(res).items():
+            fa = module1.solve_compact(image)
+            for format in ("dot", "svg"):
+                start = time.perf_counter()
+                output = io.StringIO()
+                visualizer.render(fa, output, format)
+                elapsed = time.perf_counter() - start
+                over = res <= 512 and elapsed > limit
+                slow += over
+                print(f"{res:>5} {name:<12} {format} {len(fa.table):>9} states {elapsed * 1000:>10.1f} ms "
+                      f"{len(output.getvalue()) / 2 ** 20:8.1f} MiB" + ("  SLOW" if over else ""))
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from phase0 import fa_binary
+from phase1.module1 import solve_compact
+from phase3 import module3
+from server.client import Client
+from server.worker import ServerThread
+from utils import utils
+
+
+def make_library(images: np.ndarray, size: int, seed: int = 0) -> list:
+    # shifted copies of the real pictures, so the FAs look like photos and stay distinct
+    rng = np.random.default_rng(seed)
+    return [solve_compact(np.roll(images[i % len(images)], tuple(rng.integers(-20, 20, 2)), axis=(0, 1)))
+            for i in range(size)]
+
+
+def percentiles(latencies: list[float]) -> str:
+    p50, p90, p99 = np.percentile(np.array(latencies) * 1000, [50, 90, 99])
+    return f"p50 {p50:7.1f} ms  p90 {p90:7.1f} ms  p99 {p99:7.1f} ms"
+
+
+def run(library_size: int = 1000, requests: int = 200, clients: int = 8, workers: int = 0,
+        data_directory: str = "data/module3Test") -> None:
+    _, images = utils.load_binary_images(data_directory, 128)
+    library = make_library(images, library_size)
+    queries = [np.roll(images[i % len(images)], (i % 7, -(i % 5)), axis=(0, 1)) for i in range(requests)]
+
+    json_library = [fa.serialize_json() for fa in library]
+    start = time.perf_counter()
+    for image in queries[:3]:
+        module3.solve(json_library, [image])
+    print(f"module3.solve, library reloaded per call: {(time.perf_counter() - start) / 3 * 1000:.1f} ms per image")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "library.bin")
+        fa_binary.dump(library, path)
+        socket_path = os.path.join(directory, "worker.sock")
+        started = time.perf_counter()
+        with ServerThread(socket_path, path, workers=workers) as server:
+            print(f"worker ready with {library_size} FAs in {time.perf_counter() - started:.2f} s")
+            with Client(socket_path) as client:
+                client.classify(queries[0])
+                latencies = []
+                for image in queries:
+                    start = time.perf_counter()
+                    client.classify(image)
+                    latencies.append(time.perf_counter() - start)
+            print(f"sequential  {requests:>4} requests  {percentiles(latencies)}")
+
+            latencies = []
+            lock = threading.Lock()
+
+            def send(offset: int) -> None:
+                with Client(socket_path) as client:
+                    for image in queries[offset::clients]:
+                        start = time.perf_counter()
+                        client.classify(image)
+                        with lock:
+                            latencies.append(time.perf_counter() - start)
+
+            before = server.worker.stats()
+            start = time.perf_counter()
+            threads = [threading.Thread(target=send, args=(offset,)) for offset in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            stats = server.worker.stats()
+            batches = stats["batches"] - before["batches"]
+            print(f"{clients} clients   {requests:>4} requests  {percentiles(latencies)}  "
+                  f"{requests / elapsed:6.1f} req/s  {requests / max(batches, 1):4.1f} requests per batch")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,198 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+import numpy as np
+from phase0.FA_class import DFA
+from phase1 import module1
+from phase2 import module2
+from phase3 import module3
+from phase4 import module4
+from utils import utils
+from benchmarks.bench_module1 import make_images
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, "data")
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def load_inputs(resolution: int, images: list[str]) -> dict[str, np.ndarray]:
+    inputs = make_images(resolution)
+    inputs["solid"] = np.ones((resolution, resolution), dtype=np.uint8)
+    paths, arrays = utils.load_binary_images(images, resolution)
+    for path, array in zip(paths, arrays):
+        inputs[os.path.relpath(path, DATA)] = array
+    return inputs
+
+
+def library() -> tuple[str, list[str]]:
+    with open(os.path.join(DATA, "module2Test", "json_fa.json"), 'r') as file:
+        json_fa = file.read()
+    json_fa_list = []
+    for path in sorted(glob.glob(os.path.join(DATA, "module3Test", "*.json"))):
+        with open(path, 'r') as file:
+            json_fa_list.append(file.read())
+    return json_fa, json_fa_list
+
+
+def cases(image: np.ndarray, json_fa: str, json_fa_list: list[str]) -> dict[str, Callable[[], int | None]]:
+    # each case returns the state count it produced, if it produces an automaton
+    resolution = image.shape[0]
+    fa = module1.solve(image)
+    text = fa.serialize_json()
+    library_fa = DFA.deserialize_json(json_fa)
+
+    def serialize() -> int:
+        fa.serialize_json()
+        return len(fa.states)
+
+    def percentage() -> None:
+        module2.solve_percentage(library_fa, image)
+
+    def classify() -> None:
+        module3.solve(json_fa_list, [image])
+
+    def render() -> None:
+        module4.solve(json_fa, resolution)
+
+    return {
+        "phase1.solve": lambda: len(module1.solve(image).states),
+        "DFA.serialize_json": serialize,
+        "DFA.deserialize_json": lambda: len(DFA.deserialize_json(text).states),
+        "phase2.solve_percentage": percentage,
+        "phase3.solve": classify,
+        "phase4.solve": render,
+    }
+
+
+def visualizer_case(json_fa: str) -> Callable[[], int | None] | None:
+    try:
+        import matplotlib
+        import networkx  # noqa: F401
+    except ImportError:
+        return None
+    matplotlib.use("Agg")
+    from visualization import visualizer
+
+    def run() -> None:
+        # visualize writes temp.png into the working directory
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                visualizer.visualize(json_fa, show=False)
+            finally:
+                os.chdir(cwd)
+
+    return run
+
+
+def measure(function: Callable[[], int | None], repeat: int, memory: bool) -> dict[str, float | int | None]:
+    # best wall time over the repeats, then one more run under tracemalloc for the peak
+    seconds = float("inf")
+    states = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        states = function()
+        seconds = min(seconds, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak, "states": states}
+
+
+def run(resolutions: list[int], images: list[str], only: list[str] | None = None, repeat: int = 1,
+        memory: bool = True, log=sys.stdout) -> dict:
+    json_fa, json_fa_list = library()
+    results = []
+
+    def record(case: str, name: str, resolution: int, function: Callable[[], int | None]) -> None:
+        if only and not any(case.startswith(prefix) for prefix in only):
+            return
+        result = {"case": case, "input": name, "resolution": resolution, **measure(function, repeat, memory)}
+        results.append(result)
+        peak = "" if result["peak_bytes"] is None else f"{result['peak_bytes'] / 2 ** 20:9.1f} MiB"
+        states = "" if result["states"] is None else f"{result['states']:>9} states"
+        print(f"{case:<24} {name:<20} {resolution:>5} {result['seconds'] * 1000:>10.1f} ms {peak} {states}",
+              file=log, flush=True)
+
+    for resolution in resolutions:
+        for name, image in load_inputs(resolution, images).items():
+            for case, function in cases(image, json_fa, json_fa_list).items():
+                record(case, name, resolution, function)
+    visualize = visualizer_case(json_fa)
+    if visualize is None:
+        print("visualizer.visualize skipped, matplotlib or networkx is not installed", file=log)
+    else:
+        record("visualizer.visualize", "module2Test/json_fa", 0, visualize)
+
+    return {
+        "meta": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float = 1.25, noise: float = 0.005) -> list[str]:
+    # a result regresses when it is `threshold` times slower (and `noise` seconds slower) or
+    # `threshold` times larger in peak memory or states than the baseline
+    old = {(result["case"], result["input"], result["resolution"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = old.get((result["case"], result["input"], result["resolution"]))
+        if before is None:
+            continue
+        label = f"{result['case']} {result['input']} {result['resolution']}"
+        if result["seconds"] > before["seconds"] * threshold and result["seconds"] - before["seconds"] > noise:
+            regressions.append(f"{label}: {before['seconds'] * 1000:.1f} ms -> {result['seconds'] * 1000:.1f} ms")
+        for key in ("peak_bytes", "states"):
+            if result.get(key) is not None and before.get(key) and result[key] > before[key] * threshold:
+                regressions.append(f"{label}: {key} {before[key]} -> {result[key]}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="time every phase over synthetic and real pictures")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[64, 512, 4096])
+    parser.add_argument("--images", nargs="*", default=sorted(glob.glob(os.path.join(DATA, "module3Test", "*.jpg"))),
+                        help="real pictures to include next to the synthetic ones")
+    parser.add_argument("--only", nargs="+", help="case name prefixes to run, e.g. phase1 DFA")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="report to compare against, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="store this report as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    report = run(args.resolutions, args.images, args.only, args.repeat, not args.no_memory)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=1)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, 'r') as file:
+        regressions = compare(report, json.load(file), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
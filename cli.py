@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TextIO
+from phase0 import fa_binary
+from phase1 import module1
+from phase1.lossy import solve_lossy
+from server.worker import Library, decode_image, process_batch
+from utils import utils
+
+
+class Progress:
+    # done/total, throughput and elapsed time on one rewritten stderr line
+    def __init__(self, total: int, label: str, log: TextIO = sys.stderr) -> None:
+        self.total = total
+        self.label = label
+        self.log = log
+        self.done = 0
+        self.start = time.perf_counter()
+        self.shown = 0.0
+
+    def update(self, amount: int = 1) -> None:
+        self.done += amount
+        now = time.perf_counter()
+        if now - self.shown >= 0.5 or self.done == self.total:
+            self.shown = now
+            elapsed = now - self.start
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            self.log.write(f"\r{self.label} {self.done}/{self.total}  {rate:.1f}/s  {elapsed:.1f} s")
+            self.log.flush()
+
+    def close(self) -> None:
+        if self.done:
+            self.log.write("\n")
+
+
+def stream(function: Callable, items: Iterable, workers: int, initializer: Callable | None = None,
+           initargs: tuple = (), ordered: bool = False) -> Iterator:
+    # results in completion order, or in input order when ordered; at most a few tasks per
+    # process are in flight or waiting for an earlier one, so huge directories never queue
+    # every input at once
+    if workers <= 0:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(function, items)
+        return
+    items = enumerate(items)
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        running = {}
+        finished = {}
+        next_index = 0
+        while True:
+            for index, item in items:
+                running[pool.submit(function, item)] = index
+                if len(running) + len(finished) >= 4 * workers:
+                    break
+            if not running and not finished:
+                return
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    if not ordered:
+                        yield future.result()
+                    else:
+                        finished[index] = future.result()
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def completed(output: str, key: str = "path") -> set[str]:
+    # keys already written to a JSON-lines output; a line cut short by a crash is dropped
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    good = 0
+    with open(output, 'rb') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            done.add(record[key])
+            good += len(line)
+    if good != os.path.getsize(output):
+        with open(output, 'r+b') as file:
+            file.truncate(good)
+    return done
+
+
+def _encode(task: tuple[str, str, int, float | None]) -> dict:
+    path, name, resolution, tolerance = task
+    image = utils.load_binary_image(path, resolution)
+    if tolerance:
+        approximation = solve_lossy(image, tolerance)
+        fa = approximation.fa.to_dfa()
+        record = {"path": name, "resolution": resolution, "error": approximation.error}
+    else:
+        fa = module1.solve(image)
+        record = {"path": name, "resolution": resolution}
+    record["states"] = len(fa.states)
+    record["fa"] = fa.serialize_json()
+    return record
+
+
+_library: Library | None = None
+
+
+def _load_library(path: str) -> None:
+    global _library
+    _library = Library.load(path)
+
+
+def _apply(task: tuple[str, dict]) -> dict:
+    # one library request (classify, recognize or render) inside a worker process
+    op, request = task
+    return process_batch(_library, op, [request])[0]
+
+
+def encode(args: argparse.Namespace) -> int:
+    paths = utils.image_paths(args.images)
+    binary = args.format == "binary" or args.output.endswith(".bin")
+    # the binary container cannot be appended to, so it is written from a JSON-lines journal
+    journal = args.output + ".jsonl" if binary else args.output
+    done = completed(journal) if args.resume else set()
+    if not args.resume and os.path.exists(journal):
+        os.remove(journal)
+    # records are keyed by the path relative to the common input directory
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ""
+    tasks = [(path, os.path.relpath(os.path.abspath(path), root), args.resolution, args.lossy) for path in paths]
+    tasks = [task for task in tasks if task[1] not in done]
+    if done:
+        print(f"resuming: {len(done)} of {len(paths)} images already encoded", file=sys.stderr)
+
+    progress = Progress(len(tasks), "encode")
+    states = 0
+    with open(journal, 'a') as file:
+        # input order, so library indices do not depend on which worker finished first
+        for record in stream(_encode, tasks, args.workers, ordered=True):
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            states += record["states"]
+            progress.update()
+    progress.close()
+    print(f"{len(tasks)} images encoded, {states} states, into {journal}", file=sys.stderr)
+
+    if binary:
+        library = Library.load(journal)
+        fa_binary.dump(library.fa_list, args.output)
+        # the container holds automata only; the names and resolutions go next to it
+        with open(args.output + ".meta.json", 'w') as file:
+            json.dump({"names": library.names, "resolutions": library.resolutions}, file)
+        print(f"{len(library.fa_list)} FAs written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _results(args: argparse.Namespace, op: str, library: str, requests: list[dict]) -> Iterator[dict]:
+    # the shared classify/recognize pipeline: every worker loads the library once, results
+    # come back as they complete and a resumed run skips paths the output already holds
+    done = completed(args.output) if args.output and args.resume else set()
+    requests = [request for request in requests if request["path"] not in done]
+    tasks = [(op, request) for request in requests]
+    progress = Progress(len(tasks), op)
+    for result in stream(_apply_keyed, tasks, args.workers, _load_library, (library,)):
+        progress.update()
+        yield result
+    progress.close()
+
+
+def _apply_keyed(task: tuple[str, dict]) -> dict:
+    op, request = task
+    return dict(_apply(task), path=request["path"])
+
+
+def _write_results(args: argparse.Namespace, results: Iterable[dict]) -> None:
+    if not args.output:
+        for result in results:
+            print(json.dumps(result), flush=True)
+        return
+    with open(args.output, 'a' if args.resume else 'w') as file:
+        for result in results:
+            file.write(json.dumps(result) + "\n")
+            file.flush()
+
+
+def _resolution(library: Library, requested: int | None, indices: Iterable[int] | None = None,
+                default: int = 128) -> int:
+    # the resolution the FAs were encoded at: a library is only meaningful when probed at its
+    # own depth, so an explicit resolution must agree with the recorded one
+    resolutions = library.resolutions if indices is None else [library.resolutions[i] for i in indices]
+    recorded = sorted({resolution for resolution in resolutions if resolution is not None})
+    if len(recorded) > 1:
+        raise SystemExit(f"{library.path} mixes resolutions {recorded}, encode it again at one resolution")
+    if recorded and requested is not None and requested != recorded[0]:
+        raise SystemExit(f"{library.path} was encoded at resolution {recorded[0]}, not {requested}")
+    if recorded:
+        return recorded[0]
+    return default if requested is None else requested
+
+
+def classify(args: argparse.Namespace) -> int:
+    library = Library.load(args.library)
+    names = library.names if args.names else None
+    resolution = _resolution(library, args.resolution)
+    requests = [{"path": path, "resolution": resolution, "top_k": args.top_k}
+                for path in utils.image_paths(args.images)]
+    results = _results(args, "classify", args.library, requests)
+    if names is not None:
+        results = (dict(result, name=names[result["best"]]) if result.get("best", -1) >= 0 else result
+                   for result in results)
+    _write_results(args, results)
+    return 0
+
+
+def recognize(args: argparse.Namespace) -> int:
+    resolution = _resolution(Library.load(args.fa), args.resolution, [args.index], 512)
+    requests = [{"path": path, "resolution": resolution, "fa": args.index}
+                for path in utils.image_paths(args.images)]
+    _write_results(args, _results(args, "recognize", args.fa, requests))
+    return 0
+
+
+def render(args: argparse.Namespace) -> int:
+    import cv2
+
+    library = Library.load(args.library)
+    os.makedirs(args.output, exist_ok=True)
+    tasks = []
+    for i, name in enumerate(library.names):
+        path = os.path.join(args.output, os.path.splitext(os.path.basename(name))[0] + ".png")
+        # any resolution draws the picture; by default each FA is drawn at the one it was encoded at
+        resolution = args.resolution or library.resolutions[i] or 512
+        if not (args.resume and os.path.exists(path)):
+            tasks.append(("render", {"fa": i, "resolution": resolution, "packed": True, "path": path}))
+    progress = Progress(len(tasks), "render")
+    for result in stream(_apply_keyed, tasks, args.workers, _load_library, (args.library,)):
+        if "error" in result:
+            print(f"\n{result['path']}: {result['error']}", file=sys.stderr)
+        else:
+            cv2.imwrite(result["path"], decode_image(result) * 255)
+        progress.update()
+    progress.close()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="encode, classify, recognize and render picture automata in bulk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name: str, function: Callable, help: str) -> argparse.ArgumentParser:
+        sub = commands.add_parser(name, help=help)
+        sub.set_defaults(function=function)
+        sub.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                         help="worker processes, 0 runs everything in this process")
+        sub.add_argument("--resume", action="store_true", help="skip inputs the output already holds")
+        return sub
+
+    sub = command("encode", encode, "turn a directory or glob of images into an FA library")
+    sub.add_argument("images")
+    sub.add_argument("output", help=".jsonl, or .bin for the binary container")
+    sub.add_argument("--resolution", type=int, default=512)
+    sub.add_argument("--format", choices=("jsonl", "binary"), default="jsonl")
+    sub.add_argument("--lossy", type=float, help="Hamming tolerance for lossy encoding (see phase1.lossy)")
+
+    sub = command("classify", classify, "best library FA for every image")
+    sub.add_argument("library", help="library from encode, binary container or directory of .json FAs")
+    sub.add_argument("images")
+    sub.add_argument("--output", help="JSON-lines results, stdout without it")
+    sub.add_argument("--resolution", type=int,
+                     help="defaults to the resolution the library was encoded at, 128 when it does not say")
+    sub.add_argument("--top-k", type=int, default=1)
+    sub.add_argument("--names", action="store_true", help="add the library name of the best FA")
+
+    sub = command("recognize", recognize, "check every image against one FA")
+    sub.add_argument("fa", help="JSON FA file or a library")
+    sub.add_argument("images")
+    sub.add_argument("--index", type=int, default=0, help="FA of the library to use")
+    sub.add_argument("--output", help="JSON-lines results, stdout without it")
+    sub.add_argument("--resolution", type=int,
+                     help="defaults to the resolution the FA was encoded at, 512 when the library does not say")
+
+    sub = command("render", render, "draw every FA of a library as a PNG")
+    sub.add_argument("library")
+    sub.add_argument("output", help="directory for the pictures")
+    sub.add_argument("--resolution", type=int, help="defaults to the resolution each FA was encoded at, else 512")
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
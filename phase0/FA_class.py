@@ -1,4 +1,99 @@
+import hashlib
+import io
 import json
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from typing import TextIO
+import numpy as np
+from utils import instrument
+
+
+def parse_state_id(name: str) -> int | str:
+    id = name[2:] if name.startswith("q_") else name
+    return int(id) if id.isdigit() else id
+
+
+def iter_json_object(file: TextIO, chunk_size: int = 1 << 16) -> Iterator[tuple[str, object]]:
+    # yields the members of a top-level JSON object one at a time, reading the file in chunks;
+    # a member that does not fit in the buffer doubles the next read instead of being re-read chunk by chunk
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if not eof:
+            data = file.read(max(chunk_size, len(buffer) - pos))
+            if data:
+                buffer = buffer[pos:] + data
+                pos = 0
+                return True
+            eof = True
+        return False
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\n\r":
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    def decode() -> object:
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # a number cut by the chunk boundary ("1." of "1.25") decodes too early, so a
+                # value only counts once a delimiter follows it
+                if eof or (end < len(buffer) and buffer[end] in ",:}] \t\n\r"):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_whitespace()
+        char = buffer[pos:pos + 1]
+        if char == "" or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", buffer, pos)
+        pos += 1
+        return char
+
+    expect("{")
+    skip_whitespace()
+    if buffer[pos:pos + 1] == "}":
+        return
+    while True:
+        skip_whitespace()
+        key = decode()
+        expect(":")
+        skip_whitespace()
+        yield key, decode()
+        if expect(",}") == "}":
+            return
+
+
+# quadrant q of a block sits at (row bit, column bit) = QUADRANT_BITS[q] in half blocks, so the
+# symbol of a pixel address at every level is 2 * row bit + column bit
+QUADRANTS = ('0', '1', '2', '3')
+QUADRANT_BITS = ((0, 0), (0, 1), (1, 0), (1, 1))
+
+# the dihedral symmetries of a picture as permutations of the quadrant symbols: entry q is
+# the quadrant that quadrant q moves to, at every level (quadrant = 2 * row bit + column bit)
+TRANSFORMS = {
+    "identity": (0, 1, 2, 3),
+    "rotate90": (1, 3, 0, 2),
+    "rotate180": (3, 2, 1, 0),
+    "rotate270": (2, 0, 3, 1),
+    "flip_horizontal": (1, 0, 3, 2),
+    "flip_vertical": (2, 3, 0, 1),
+    "transpose": (0, 2, 1, 3),
+    "anti_transpose": (3, 1, 2, 0),
+}
 
 
 class State:
@@ -27,47 +122,72 @@ class DFA:
         self.states: list['State'] = []
         self.alphabet: list['str'] = []
         self.final_states: list['State'] = []
+        self._state_index: dict[int | str, 'State'] = {}
 
     @staticmethod
     def deserialize_json(json_str: str) -> 'DFA':
-        fa = DFA()
-        json_fa = json.loads(json_str)
-
-        fa.alphabet = json_fa["alphabet"]
-
-        for state_str in json_fa["states"]:
-            fa.add_state(state_str[2:])
-
-        fa.init_state = fa.get_state_by_id(json_fa["initial_state"][2:])
+        instrument.count("phase0.bytes_parsed", len(json_str))
+        return DFA.from_json_items(json.loads(json_str).items())
 
-        for final_str in json_fa["final_states"]:
-            fa.add_final_state(fa.get_state_by_id(final_str[2:]))
+    @staticmethod
+    def load_json(file: str | TextIO) -> 'DFA':
+        if isinstance(file, str):
+            with open(file, 'r') as f:
+                return DFA.from_json_items(iter_json_object(f))
+        return DFA.from_json_items(iter_json_object(file))
 
-        for state_str in json_fa["states"]:
-            for symbol in fa.alphabet:
-                fa.add_transition(fa.get_state_by_id(state_str[2:]), fa.get_state_by_id(json_fa[state_str][symbol][2:]),
-                                  symbol)
+    @staticmethod
+    def from_json_items(items: Iterable[tuple[str, object]]) -> 'DFA':
+        fa = DFA()
+        init_name = None
+        final_names = []
+        for key, value in items:
+            if key == "states":
+                for state_str in value:
+                    fa._state_for(state_str)
+            elif key == "initial_state":
+                init_name = value
+            elif key == "final_states":
+                final_names = value
+            elif key == "alphabet":
+                fa.alphabet = value
+            else:
+                state = fa._state_for(key)
+                for symbol, next_state_str in value.items():
+                    fa.add_transition(state, fa._state_for(next_state_str), symbol)
+
+        fa.init_state = fa._state_for(init_name)
+        for final_str in final_names:
+            fa.add_final_state(fa._state_for(final_str))
 
         return fa
 
-    def serialize_json(self) -> str:
-        fa = {
-            "states": list(map(lambda s: f"q_{s.id}", self.states)),
-            "initial_state": f"q_{self.init_state.id}",
-            "final_states": list(map(lambda s: f"q_{s.id}", self.final_states)),
-            "alphabet": self.alphabet
-        }
+    def _state_for(self, name: str) -> State:
+        id = parse_state_id(name)
+        state = self.get_state_by_id(id)
+        return self.add_state(id) if state is None else state
 
-        for state in self.states:
-            fa[f"q_{state.id}"] = {}
-            for symbol in self.alphabet:
-                fa[f"q_{state.id}"][symbol] = f"q_{state.transitions[symbol].id}"
-
-        return json.dumps(fa)
+    def serialize_json(self) -> str:
+        out = io.StringIO()
+        self.dump_json(out)
+        return out.getvalue()
+
+    def dump_json(self, file: TextIO) -> None:
+        # writes the same text as json.dumps of the full dict, one state at a time
+        names = {state: f"q_{state.id}" for state in self.states}
+        file.write('{"states": ' + json.dumps(list(names.values())))
+        file.write(', "initial_state": ' + json.dumps(names[self.init_state]))
+        file.write(', "final_states": ' + json.dumps([names[state] for state in self.final_states]))
+        file.write(', "alphabet": ' + json.dumps(self.alphabet))
+        for state, name in names.items():
+            file.write(', ' + json.dumps(name) + ': ')
+            file.write(json.dumps({symbol: names[state.transitions[symbol]] for symbol in self.alphabet}))
+        file.write('}')
 
     def add_state(self, id: int | None = None) -> State:
         state = State(id)
         self.states.append(state)
+        self._state_index.setdefault(state.id, state)
         return state
 
     def add_transition(self, from_state: State, to_state: State, input_symbol: str) -> None:
@@ -80,14 +200,412 @@ class DFA:
         self.final_states.append(state)
 
     def get_state_by_id(self, id) -> State | None:
-        for state in self.states:
-            if state.id == id:
-                return state
-        return None
+        if len(self._state_index) != len(self.states):
+            # states were added behind add_state's back
+            self._state_index = {}
+            for state in self.states:
+                self._state_index.setdefault(state.id, state)
+        return self._state_index.get(id)
 
     def is_final(self, state: State) -> bool:
         return state in self.final_states
 
+    def compact(self) -> 'CompactDFA':
+        return CompactDFA.from_dfa(self)
+
+    def minimize(self) -> 'DFA':
+        return self.compact().minimize().to_dfa()
+
+    def canonical(self) -> 'DFA':
+        return self.compact().canonical().to_dfa()
+
+    def canonical_hash(self) -> str:
+        return self.compact().canonical_hash()
+
+    def intersection(self, other: 'DFA', minimize: bool = False) -> 'DFA':
+        return self.compact().intersection(CompactDFA.from_dfa(other), minimize).to_dfa()
+
+    def union(self, other: 'DFA', minimize: bool = False) -> 'DFA':
+        return self.compact().union(CompactDFA.from_dfa(other), minimize).to_dfa()
+
+    def symmetric_difference(self, other: 'DFA', minimize: bool = False) -> 'DFA':
+        return self.compact().symmetric_difference(CompactDFA.from_dfa(other), minimize).to_dfa()
+
+    def difference(self, other: 'DFA', minimize: bool = False) -> 'DFA':
+        return self.compact().difference(CompactDFA.from_dfa(other), minimize).to_dfa()
+
+    def complement(self) -> 'DFA':
+        return self.compact().complement().to_dfa()
+
+    def is_subset(self, other: 'DFA', depth: int | None = None) -> bool:
+        return self.compact().is_subset(CompactDFA.from_dfa(other), depth)
+
+    def is_equivalent(self, other: 'DFA', depth: int | None = None) -> bool:
+        return self.compact().is_equivalent(CompactDFA.from_dfa(other), depth)
+
+    def transform(self, name: str) -> 'DFA':
+        return self.compact().transform(name).to_dfa()
+
+    def crop(self, address: str) -> 'DFA':
+        return self.compact().crop(address).to_dfa()
+
+
+class CompactState:
+    # read-only view of one row of a CompactDFA; its id is the row index
+    __slots__ = ('fa', 'id')
+
+    def __init__(self, fa: 'CompactDFA', id: int) -> None:
+        self.fa = fa
+        self.id = id
+
+    @property
+    def transitions(self) -> 'CompactTransitions':
+        return CompactTransitions(self.fa, self.id)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactState) and other.fa is self.fa and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash((id(self.fa), self.id))
+
+    def __repr__(self) -> str:
+        return f"CompactState(q_{self.id})"
+
+
+class CompactTransitions(Mapping):
+    __slots__ = ('fa', 'row')
+
+    def __init__(self, fa: 'CompactDFA', row: int) -> None:
+        self.fa = fa
+        self.row = row
+
+    def __getitem__(self, symbol: str) -> CompactState:
+        return CompactState(self.fa, int(self.fa.table[self.row, self.fa.symbol_index[symbol]]))
+
+    def __iter__(self):
+        return iter(self.fa.alphabet)
+
+    def __len__(self) -> int:
+        return len(self.fa.alphabet)
+
+
+class CompactStates(Sequence):
+    __slots__ = ('fa',)
+
+    def __init__(self, fa: 'CompactDFA') -> None:
+        self.fa = fa
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CompactState(self.fa, i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return CompactState(self.fa, index)
+
+    def __len__(self) -> int:
+        return self.fa.table.shape[0]
+
+
+class CompactDFA:
+    # a DFA stored as an int32 transition table of shape (states, alphabet) and a
+    # boolean final mask; states are identified by their row index
+    def __init__(self, table: np.ndarray, final_mask: np.ndarray, alphabet: list[str], init_index: int = 0) -> None:
+        self.table = np.asarray(table)
+        if self.table.dtype != np.int32:
+            self.table = self.table.astype(np.int32)
+        self.final_mask = np.asarray(final_mask, dtype=bool)
+        self.alphabet = list(alphabet)
+        self.symbol_index = {symbol: column for column, symbol in enumerate(self.alphabet)}
+        self.init_index = int(init_index)
+
+    @staticmethod
+    def from_dfa(dfa: DFA) -> 'CompactDFA':
+        if isinstance(dfa, CompactDFA):
+            return dfa
+        index = {state: row for row, state in enumerate(dfa.states)}
+        table = np.array([[index[state.transitions[symbol]] for symbol in dfa.alphabet] for state in dfa.states],
+                         dtype=np.int32).reshape(len(dfa.states), len(dfa.alphabet))
+        final_mask = np.zeros(len(dfa.states), dtype=bool)
+        for state in dfa.final_states:
+            final_mask[index[state]] = True
+        return CompactDFA(table, final_mask, dfa.alphabet, index[dfa.init_state])
+
+    @staticmethod
+    def deserialize_json(json_str: str) -> 'CompactDFA':
+        instrument.count("phase0.bytes_parsed", len(json_str))
+        return CompactDFA.from_json_items(json.loads(json_str).items())
+
+    @staticmethod
+    def load_json(file: str | TextIO) -> 'CompactDFA':
+        if isinstance(file, str):
+            with open(file, 'r') as f:
+                return CompactDFA.from_json_items(iter_json_object(f))
+        return CompactDFA.from_json_items(iter_json_object(file))
+
+    @staticmethod
+    def from_json_items(items: Iterable[tuple[str, object]]) -> 'CompactDFA':
+        # rows follow the order of the "states" list
+        fields = {}
+        transitions = {}
+        for key, value in items:
+            if key in ("states", "initial_state", "final_states", "alphabet"):
+                fields[key] = value
+            else:
+                transitions[key] = value
+        rows = {name: row for row, name in enumerate(fields["states"])}
+        alphabet = fields["alphabet"]
+        table = np.array([[rows[transitions[name][symbol]] for symbol in alphabet] for name in fields["states"]],
+                         dtype=np.int32).reshape(len(rows), len(alphabet))
+        final_mask = np.zeros(len(rows), dtype=bool)
+        final_mask[[rows[name] for name in fields["final_states"]]] = True
+        return CompactDFA(table, final_mask, alphabet, rows[fields["initial_state"]])
+
+    def serialize_json(self) -> str:
+        return self.to_dfa().serialize_json()
+
+    def to_dfa(self) -> DFA:
+        dfa = DFA()
+        dfa.alphabet = list(self.alphabet)
+        states = [dfa.add_state(row) for row in range(len(self.table))]
+        dfa.assign_initial_state(states[self.init_index])
+        for row in np.flatnonzero(self.final_mask).tolist():
+            dfa.add_final_state(states[row])
+        for state, targets in zip(states, self.table.tolist()):
+            for symbol, target in zip(self.alphabet, targets):
+                dfa.add_transition(state, states[target], symbol)
+        return dfa
+
+    def compact(self) -> 'CompactDFA':
+        return self
+
+    @property
+    def init_state(self) -> CompactState:
+        return CompactState(self, self.init_index)
+
+    @property
+    def states(self) -> CompactStates:
+        return CompactStates(self)
+
+    @property
+    def final_states(self) -> list[CompactState]:
+        return [CompactState(self, row) for row in np.flatnonzero(self.final_mask).tolist()]
+
+    def get_state_by_id(self, id) -> CompactState | None:
+        id = int(id)
+        return CompactState(self, id) if 0 <= id < len(self.table) else None
+
+    def is_final(self, state: CompactState | int) -> bool:
+        return bool(self.final_mask[state if isinstance(state, int) else state.id])
+
+    def step(self, state: int, symbol: str) -> int:
+        return int(self.table[state, self.symbol_index[symbol]])
+
+    def reachable(self) -> np.ndarray:
+        seen = np.zeros(len(self.table), dtype=bool)
+        seen[self.init_index] = True
+        frontier = np.array([self.init_index])
+        while len(frontier) > 0:
+            targets = np.unique(self.table[frontier])
+            frontier = targets[~seen[targets]]
+            seen[frontier] = True
+        return seen
+
+    def canonical(self) -> 'CompactDFA':
+        # drops unreachable states, sorts the alphabet and renumbers the states in breadth-first
+        # order from init_state, so isomorphic machines get identical tables
+        order = sorted(range(len(self.alphabet)), key=lambda column: self.alphabet[column])
+        table = self.table[:, order].tolist()
+        numbers = {self.init_index: 0}
+        queue = [self.init_index]
+        for state in queue:
+            for target in table[state]:
+                if target not in numbers:
+                    numbers[target] = len(queue)
+                    queue.append(target)
+        canonical_table = np.array([[numbers[target] for target in table[state]] for state in queue],
+                                   dtype=np.int32).reshape(len(queue), len(order))
+        return CompactDFA(canonical_table, self.final_mask[queue], [self.alphabet[c] for c in order], 0)
+
+    def minimize(self) -> 'CompactDFA':
+        # Hopcroft's partition refinement over the reachable states, returned in canonical form
+        fa = self.canonical()
+        n, width = fa.table.shape
+        inverse = []
+        for column in range(width):
+            order = np.argsort(fa.table[:, column], kind='stable')
+            bounds = np.searchsorted(fa.table[order, column], np.arange(n + 1))
+            inverse.append((order.tolist(), bounds.tolist()))
+
+        block_of = fa.final_mask.astype(np.int64).tolist()
+        blocks = [set(np.flatnonzero(~fa.final_mask).tolist()), set(np.flatnonzero(fa.final_mask).tolist())]
+        if not blocks[0] or not blocks[1]:
+            block_of = [0] * n
+            blocks = [set(range(n))]
+        work = {min(range(len(blocks)), key=lambda b: len(blocks[b]))} if len(blocks) > 1 else set()
+        while work:
+            splitter = list(blocks[work.pop()])
+            for order, bounds in inverse:
+                touched: dict[int, list[int]] = {}
+                for target in splitter:
+                    for source in order[bounds[target]:bounds[target + 1]]:
+                        touched.setdefault(block_of[source], []).append(source)
+                for block, sources in touched.items():
+                    if len(sources) == len(blocks[block]):
+                        continue
+                    # the touched states move out, so a split costs what the splitter scan already paid
+                    moved = set(sources)
+                    blocks[block] -= moved
+                    blocks.append(moved)
+                    for state in sources:
+                        block_of[state] = len(blocks) - 1
+                    if block in work:
+                        work.add(len(blocks) - 1)
+                    else:
+                        work.add(len(blocks) - 1 if len(moved) <= len(blocks[block]) else block)
+
+        block_of = np.array(block_of, dtype=np.int32)
+        representatives = np.array([next(iter(block)) for block in blocks])
+        minimal = CompactDFA(block_of[fa.table[representatives]], fa.final_mask[representatives], fa.alphabet,
+                             block_of[fa.init_index])
+        return minimal.canonical()
+
+    def canonical_hash(self) -> str:
+        # equal for every pair of machines accepting the same language
+        fa = self.minimize()
+        digest = hashlib.sha256()
+        digest.update(json.dumps(fa.alphabet).encode())
+        digest.update(np.int64(fa.table.shape[0]).tobytes())
+        digest.update(fa.table.astype('<i4').tobytes())
+        digest.update(np.packbits(fa.final_mask).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def depth_of(resolution: int, name: str = "resolution") -> int:
+        # the address length of a square picture with this side
+        if resolution <= 0 or resolution & (resolution - 1) != 0:
+            raise ValueError(f"{name} must be a power of two, got {resolution}")
+        return resolution.bit_length() - 1
+
+    @staticmethod
+    def pixel_address(row: int, col: int, depth: int) -> str:
+        return ''.join(QUADRANTS[(row >> bit & 1) * 2 + (col >> bit & 1)] for bit in range(depth - 1, -1, -1))
+
+    def quadrant_columns(self) -> list[int]:
+        # the table column of every quadrant symbol, in quadrant order
+        return [self.symbol_index[symbol] for symbol in QUADRANTS]
+
+    def quadrant_table(self) -> np.ndarray:
+        # the transition table with column q holding quadrant q
+        return self.table[:, self.quadrant_columns()]
+
+    def transform(self, name: str) -> 'CompactDFA':
+        # rotations (clockwise) and flips only relabel the quadrant columns; no pixel is touched
+        columns = self.quadrant_columns()
+        table = self.table.copy()
+        for quadrant, moved in enumerate(TRANSFORMS[name]):
+            table[:, columns[moved]] = self.table[:, columns[quadrant]]
+        return CompactDFA(table, self.final_mask, self.alphabet, self.init_index)
+
+    def crop(self, address: str) -> 'CompactDFA':
+        # the quadrant at address, drawn at its own resolution
+        state = self.init_index
+        for symbol in address:
+            state = self.step(state, symbol)
+        return CompactDFA(self.table, self.final_mask, self.alphabet, state)
+
+    # finality of a product state from the finality of its two components
+    PRODUCT_OPERATIONS = {
+        "and": np.logical_and,
+        "or": np.logical_or,
+        "xor": np.logical_xor,
+        "difference": lambda final1, final2: final1 & ~final2,
+    }
+
+    def _aligned(self, other: 'CompactDFA') -> np.ndarray:
+        # other's table with its columns in the order of self.alphabet
+        if sorted(self.alphabet) != sorted(other.alphabet):
+            raise ValueError(f"alphabets differ: {self.alphabet} and {other.alphabet}")
+        return other.table[:, [other.symbol_index[symbol] for symbol in self.alphabet]]
+
+    def _product_states(self, other: 'CompactDFA', bad=None) -> tuple[list[tuple[int, int]], list[list[int]]] | None:
+        # breadth-first over the reachable pairs only; returns None as soon as a pair satisfies bad
+        table1 = self.table.tolist()
+        table2 = self._aligned(other).tolist()
+        final1 = self.final_mask.tolist()
+        final2 = other.final_mask.tolist()
+        pairs = [(self.init_index, other.init_index)]
+        numbers = {pairs[0]: 0}
+        transitions = []
+        for state1, state2 in pairs:
+            if bad is not None and bad(final1[state1], final2[state2]):
+                return None
+            row = []
+            for next1, next2 in zip(table1[state1], table2[state2]):
+                pair = (next1, next2)
+                number = numbers.get(pair)
+                if number is None:
+                    number = numbers[pair] = len(pairs)
+                    pairs.append(pair)
+                row.append(number)
+            transitions.append(row)
+        return pairs, transitions
+
+    def product(self, other: 'CompactDFA', operation: str, minimize: bool = False) -> 'CompactDFA':
+        pairs, transitions = self._product_states(other)
+        states1, states2 = np.array(pairs).T
+        final_mask = CompactDFA.PRODUCT_OPERATIONS[operation](self.final_mask[states1], other.final_mask[states2])
+        fa = CompactDFA(np.array(transitions, dtype=np.int32), final_mask, self.alphabet, 0)
+        return fa.minimize() if minimize else fa
+
+    def intersection(self, other: 'CompactDFA', minimize: bool = False) -> 'CompactDFA':
+        return self.product(other, "and", minimize)
+
+    def union(self, other: 'CompactDFA', minimize: bool = False) -> 'CompactDFA':
+        return self.product(other, "or", minimize)
+
+    def symmetric_difference(self, other: 'CompactDFA', minimize: bool = False) -> 'CompactDFA':
+        return self.product(other, "xor", minimize)
+
+    def difference(self, other: 'CompactDFA', minimize: bool = False) -> 'CompactDFA':
+        return self.product(other, "difference", minimize)
+
+    def complement(self) -> 'CompactDFA':
+        return CompactDFA(self.table, ~self.final_mask, self.alphabet, self.init_index)
+
+    def _pairs_at_depth(self, other: 'CompactDFA', depth: int) -> tuple[np.ndarray, np.ndarray]:
+        # the distinct pairs reached by words of exactly this length, one level at a time
+        table1 = self.table.astype(np.int64)
+        table2 = self._aligned(other).astype(np.int64)
+        width = len(table2)
+        keys = np.array([self.init_index * width + other.init_index], dtype=np.int64)
+        for _ in range(depth):
+            keys = np.unique(table1[keys // width] * width + table2[keys % width])
+        return keys // width, keys % width
+
+    def is_subset(self, other: 'CompactDFA', depth: int | None = None) -> bool:
+        # with a depth, only words of that length count, e.g. the pixels of a picture
+        if depth is None:
+            return self._product_states(other, lambda final1, final2: final1 and not final2) is not None
+        states1, states2 = self._pairs_at_depth(other, depth)
+        return not np.any(self.final_mask[states1] & ~other.final_mask[states2])
+
+    def is_equivalent(self, other: 'CompactDFA', depth: int | None = None) -> bool:
+        if depth is None:
+            return self._product_states(other, lambda final1, final2: final1 != final2) is not None
+        states1, states2 = self._pairs_at_depth(other, depth)
+        return np.array_equal(self.final_mask[states1], other.final_mask[states2])
+
+    def accepted_counts(self, length: int, symbols: list[str] | None = None) -> np.ndarray:
+        # row r holds, for every state, the number of accepted words of length r over symbols
+        columns = self.table if symbols is None else self.table[:, [self.symbol_index[s] for s in symbols]]
+        counts = np.empty((length + 1, len(self.table)), dtype=np.int64)
+        counts[0] = self.final_mask
+        for r in range(1, length + 1):
+            counts[r] = counts[r - 1][columns].sum(axis=1)
+        return counts
+
 
 class NFAState:
     __counter = 0
@@ -120,29 +638,53 @@ class NFA:
         self.states: list['NFAState'] = []
         self.alphabet: list['str'] = []
         self.final_states: list['NFAState'] = []
+        self._state_index: dict[int | str, 'NFAState'] = {}
+        # the bitset tables of _bitset_core, dropped by every method that edits the machine
+        self._core: tuple | None = None
 
+    @staticmethod
     def deserialize_json(json_str: str) -> 'NFA':
-        fa = NFA()
-        json_fa = json.loads(json_str)
-
-        fa.alphabet = json_fa["alphabet"]
-
-        for state_str in json_fa["states"]:
-            fa.add_state(int(state_str[2:]))
+        return NFA.from_json_items(json.loads(json_str).items())
 
-        fa.init_state = fa.get_state_by_id(json_fa["initial_state"][2:])
-
-        for final_str in json_fa["final_states"]:
-            fa.add_final_state(fa.get_state_by_id(final_str[2:]))
+    @staticmethod
+    def load_json(file: str | TextIO) -> 'NFA':
+        if isinstance(file, str):
+            with open(file, 'r') as f:
+                return NFA.from_json_items(iter_json_object(f))
+        return NFA.from_json_items(iter_json_object(file))
 
-        for state_str in json_fa["states"]:
-            for symbol in fa.alphabet:
-                next_states = json_fa[state_str][symbol]
-                for next_state_str in next_states:
-                    fa.add_transition(fa.get_state_by_id(state_str[2:]), fa.get_state_by_id(next_state_str[2:]), symbol)
+    @staticmethod
+    def from_json_items(items: Iterable[tuple[str, object]]) -> 'NFA':
+        fa = NFA()
+        init_name = None
+        final_names = []
+        for key, value in items:
+            if key == "states":
+                for state_str in value:
+                    fa._state_for(state_str)
+            elif key == "initial_state":
+                init_name = value
+            elif key == "final_states":
+                final_names = value
+            elif key == "alphabet":
+                fa.alphabet = value
+            else:
+                state = fa._state_for(key)
+                for symbol, next_states in value.items():
+                    for next_state_str in next_states:
+                        fa.add_transition(state, fa._state_for(next_state_str), symbol)
+
+        fa.init_state = fa._state_for(init_name)
+        for final_str in final_names:
+            fa.add_final_state(fa._state_for(final_str))
 
         return fa
 
+    def _state_for(self, name: str) -> NFAState:
+        id = parse_state_id(name)
+        state = self.get_state_by_id(id)
+        return self.add_state(id) if state is None else state
+
     def serialize_json(self) -> str:
         fa = {
             "states": list(map(lambda s: f"q_{s.id}", self.states)),
@@ -153,7 +695,7 @@ class NFA:
 
         for state in self.states:
             fa[f"q_{state.id}"] = {}
-            for symbol in self.alphabet:
+            for symbol in self.alphabet + ([""] if "" in state.transitions else []):
                 next_state_ids = []
                 for next_state in state.transitions.get(symbol, []):
                     next_state_ids.append(f"q_{next_state.id}")
@@ -164,25 +706,32 @@ class NFA:
     def add_state(self, id: int | None = None) -> NFAState:
         state = NFAState(id)
         self.states.append(state)
+        self._state_index.setdefault(state.id, state)
+        self._core = None
         return state
 
     def add_transition(self, from_state: NFAState, to_state: NFAState, input_symbol: str) -> None:
         from_state.add_transition(input_symbol, to_state)
+        self._core = None
 
     def add_epsilon_transition(self, from_state: NFAState, to_state: NFAState) -> None:
         from_state.add_epsilon_transition(to_state)
+        self._core = None
 
     def assign_initial_state(self, state: NFAState) -> None:
         self.init_state = state
+        self._core = None
 
     def add_final_state(self, state: NFAState) -> None:
         self.final_states.append(state)
+        self._core = None
 
     def get_state_by_id(self, id) -> NFAState | None:
-        for state in self.states:
-            if state.id == id:
-                return state
-        return None
+        if len(self._state_index) != len(self.states):
+            self._state_index = {}
+            for state in self.states:
+                self._state_index.setdefault(state.id, state)
+        return self._state_index.get(id)
 
     def is_final(self, state: NFAState) -> bool:
         return state in self.final_states
@@ -206,83 +755,181 @@ class NFA:
 
         return nfa_machine
 
+    def _copy_states(self, machine: 'NFA') -> dict[NFAState, NFAState]:
+        # fresh, sequentially numbered copies, so machines can be combined any number of times
+        copies = {state: self.add_state(len(self.states)) for state in machine.states}
+        for state in machine.states:
+            for symbol, next_states in state.transitions.items():
+                for next_state in next_states:
+                    self.add_transition(copies[state], copies[next_state], symbol)
+        return copies
+
     @staticmethod
     def union(machine1: 'NFA', machine2: 'NFA') -> 'NFA':
         union_machine = NFA()
-        union_machine.alphabet = list(set(machine1.alphabet + machine2.alphabet))
+        union_machine.alphabet = list(dict.fromkeys(machine1.alphabet + machine2.alphabet))
 
-        init_state = union_machine.add_state()
+        init_state = union_machine.add_state(0)
         union_machine.assign_initial_state(init_state)
-        union_machine.add_transition(init_state, machine1.init_state, "")
-        union_machine.add_transition(init_state, machine2.init_state, "")
-
-        for final_state in machine1.final_states:
-            union_machine.add_final_state(final_state)
-        for final_state in machine2.final_states:
-            union_machine.add_final_state(final_state)
-
-        for state in machine1.states + machine2.states:
-            union_state = union_machine.add_state(state.id)
-            if state == machine1.init_state or state == machine2.init_state:
-                union_machine.add_transition(init_state, union_state, "")
-            if state in machine1.final_states or state in machine2.final_states:
-                union_machine.add_transition(union_state, init_state, "")
-
-            for symbol, next_states in state.transitions.items():
-                for next_state in next_states:
-                    union_machine.add_transition(union_state, union_machine.get_state_by_id(next_state.id), symbol)
+        for machine in (machine1, machine2):
+            copies = union_machine._copy_states(machine)
+            union_machine.add_epsilon_transition(init_state, copies[machine.init_state])
+            for final_state in machine.final_states:
+                union_machine.add_final_state(copies[final_state])
 
         return union_machine
 
     @staticmethod
     def concat(machine1: 'NFA', machine2: 'NFA') -> 'NFA':
         concat_machine = NFA()
-        concat_machine.alphabet = list(set(machine1.alphabet + machine2.alphabet))
-
-        for state in machine1.states:
-            concat_state = concat_machine.add_state(state.id)
-            if state == machine1.init_state:
-                concat_machine.assign_initial_state(concat_state)
-            if state in machine1.final_states:
-                concat_machine.add_final_state(concat_state)
-            for symbol, next_states in state.transitions.items():
-                for next_state in next_states:
-                    concat_machine.add_transition(concat_state, concat_machine.get_state_by_id(next_state.id), symbol)
-
-        for state in machine2.states:
-            concat_state = concat_machine.add_state(state.id)
-            if state == machine2.init_state:
-                concat_machine.add_transition(concat_machine.final_states[0], concat_state, "")
-            if state in machine2.final_states:
-                concat_machine.add_final_state(concat_state)
-            for symbol, next_states in state.transitions.items():
-                for next_state in next_states:
-                    concat_machine.add_transition(concat_state, concat_machine.get_state_by_id(next_state.id), symbol)
+        concat_machine.alphabet = list(dict.fromkeys(machine1.alphabet + machine2.alphabet))
+
+        copies1 = concat_machine._copy_states(machine1)
+        copies2 = concat_machine._copy_states(machine2)
+        concat_machine.assign_initial_state(copies1[machine1.init_state])
+        for final_state in machine1.final_states:
+            concat_machine.add_epsilon_transition(copies1[final_state], copies2[machine2.init_state])
+        for final_state in machine2.final_states:
+            concat_machine.add_final_state(copies2[final_state])
 
         return concat_machine
 
     @staticmethod
     def star(machine: 'NFA') -> 'NFA':
         star_machine = NFA()
-        star_machine.alphabet = machine.alphabet
+        star_machine.alphabet = list(machine.alphabet)
 
-        init_state = star_machine.add_state()
+        # the new initial state is final, so the empty word is accepted
+        init_state = star_machine.add_state(0)
         star_machine.assign_initial_state(init_state)
-        star_machine.add_transition(init_state, machine.init_state, "")
-        star_machine.add_transition(init_state, star_machine.final_states[0], "")
-
+        star_machine.add_final_state(init_state)
+        copies = star_machine._copy_states(machine)
+        star_machine.add_epsilon_transition(init_state, copies[machine.init_state])
         for final_state in machine.final_states:
-            star_machine.add_transition(final_state, init_state, "")
-        for state in machine.states:
-            star_state = star_machine.add_state(state.id)
-            if state == machine.init_state:
-                star_machine.add_transition(init_state, star_state, "")
-            if state in machine.final_states:
-                star_machine.add_transition(star_state, init_state, "")
-            for symbol, next_states in state.transitions.items():
-                for next_state in next_states:
-                    star_machine.add_transition(star_state, star_machine.get_state_by_id(next_state.id), symbol)
+            star_machine.add_epsilon_transition(copies[final_state], init_state)
 
         return star_machine
 
+    def _epsilon_closures(self, index: dict[NFAState, int]) -> list[int]:
+        # closure of every state as a bitset; Tarjan's algorithm finishes the strongly
+        # connected components of the epsilon graph successors first, so each component
+        # only has to OR in closures that are already complete
+        successors = [[index[next_state] for next_state in state.transitions.get("", [])] for state in self.states]
+        n = len(successors)
+        closures = [0] * n
+        order = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        component_of = [-1] * n
+        stack = []
+        counter = 0
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child = work.pop()
+                if child == 0:
+                    order[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                if child < len(successors[node]):
+                    work.append((node, child + 1))
+                    next_node = successors[node][child]
+                    if order[next_node] == -1:
+                        work.append((next_node, 0))
+                    elif on_stack[next_node]:
+                        low[node] = min(low[node], order[next_node])
+                    continue
+                if work and work[-1][0] != node:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    closure = 0
+                    done = {node}
+                    for member in component:
+                        closure |= 1 << member
+                        component_of[member] = node
+                    for member in component:
+                        for next_node in successors[member]:
+                            if component_of[next_node] not in done:
+                                done.add(component_of[next_node])
+                                closure |= closures[next_node]
+                    for member in component:
+                        closures[member] = closure
+        return closures
+
+    def _bitset_core(self) -> tuple[list[list[int]], int, int, dict[str, int]]:
+        # per state and symbol, the epsilon-closed set of successors as a bitset, plus the
+        # closed initial set, the final set and the column of every symbol; built once and
+        # kept until the machine is edited (the alphabet is assigned directly, so it is
+        # part of the key)
+        if self._core is not None and self._core[0] == self.alphabet:
+            return self._core[1]
+        index = {state: i for i, state in enumerate(self.states)}
+        closures = self._epsilon_closures(index)
+        moves = []
+        for state in self.states:
+            row = []
+            for symbol in self.alphabet:
+                targets = 0
+                for next_state in state.transitions.get(symbol, []):
+                    targets |= closures[index[next_state]]
+                row.append(targets)
+            moves.append(row)
+        finals = 0
+        for state in self.final_states:
+            finals |= 1 << index[state]
+        column = {symbol: i for i, symbol in enumerate(self.alphabet)}
+        core = moves, closures[index[self.init_state]], finals, column
+        self._core = (list(self.alphabet), core)
+        return core
+
+    @staticmethod
+    def _step(moves: list[list[int]], subset: int, column: int) -> int:
+        res = 0
+        while subset:
+            bit = subset & -subset
+            res |= moves[bit.bit_length() - 1][column]
+            subset ^= bit
+        return res
+
+    def accepts(self, word: str) -> bool:
+        moves, subset, finals, column = self._bitset_core()
+        for char in word:
+            subset = NFA._step(moves, subset, column[char])
+        return bool(subset & finals)
+
+    def determinize(self, minimize: bool = False) -> 'DFA':
+        return self.determinize_compact(minimize).to_dfa()
+
+    def determinize_compact(self, minimize: bool = False) -> 'CompactDFA':
+        # subset construction over the subsets reachable from the initial closure;
+        # the empty subset becomes the dead state, so the result is complete
+        moves, init, finals, _ = self._bitset_core()
+        rows = {init: 0}
+        subsets = [init]
+        table = []
+        for subset in subsets:
+            row = []
+            for column in range(len(self.alphabet)):
+                next_subset = NFA._step(moves, subset, column)
+                if next_subset not in rows:
+                    rows[next_subset] = len(subsets)
+                    subsets.append(next_subset)
+                row.append(rows[next_subset])
+            table.append(row)
+        table = np.array(table, dtype=np.int32).reshape(len(subsets), len(self.alphabet))
+        final_mask = np.array([bool(subset & finals) for subset in subsets], dtype=bool)
+        fa = CompactDFA(table, final_mask, self.alphabet)
+        return fa.minimize() if minimize else fa
+
     # def serialize_to_json(self) -> str:
@@ -0,0 +1,128 @@
+import io
+import json
+import mmap
+import struct
+from typing import BinaryIO
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA
+from utils import instrument
+
+# file:  magic, version, FA count, then one uint64 offset per FA
+# entry: states, symbols, initial row, flags, alphabet length, canonical hash, then the
+#        JSON alphabet, the uint32 transition table and the final-state bitset, each 8-byte aligned
+MAGIC = b"TLAFA\x00"
+VERSION = 1
+FILE_HEADER = struct.Struct("<6sHI4x")
+ENTRY_HEADER = struct.Struct("<IIIII32s4x")
+HAS_HASH = 1
+
+
+def _aligned(size: int) -> int:
+    return -(-size // 8) * 8
+
+
+def is_binary(data: object) -> bool:
+    return isinstance(data, (bytes, bytearray, memoryview, mmap.mmap)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def _entry(fa: DFA | CompactDFA, with_hash: bool) -> list[bytes]:
+    fa = CompactDFA.from_dfa(fa)
+    alphabet = json.dumps(fa.alphabet).encode()
+    digest = bytes.fromhex(fa.canonical_hash()) if with_hash else bytes(32)
+    header = ENTRY_HEADER.pack(len(fa.table), len(fa.alphabet), fa.init_index, HAS_HASH if with_hash else 0,
+                               len(alphabet), digest)
+    finals = np.packbits(fa.final_mask).tobytes()
+    return [header,
+            alphabet.ljust(_aligned(len(alphabet)), b"\x00"),
+            np.ascontiguousarray(fa.table, dtype="<u4").tobytes(),
+            finals.ljust(_aligned(len(finals)), b"\x00")]
+
+
+def dump(fa_list: list[DFA | CompactDFA], file: str | BinaryIO, with_hash: bool = True) -> None:
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            return dump(fa_list, f, with_hash)
+    entries = [_entry(fa, with_hash) for fa in fa_list]
+    offset = FILE_HEADER.size + 8 * len(entries)
+    offsets = []
+    for parts in entries:
+        offsets.append(offset)
+        offset += sum(len(part) for part in parts)
+    file.write(FILE_HEADER.pack(MAGIC, VERSION, len(entries)))
+    file.write(np.array(offsets, dtype="<u8").tobytes())
+    for parts in entries:
+        for part in parts:
+            file.write(part)
+
+
+def dumps(fa_list: list[DFA | CompactDFA], with_hash: bool = True) -> bytes:
+    out = io.BytesIO()
+    dump(fa_list, out, with_hash)
+    return out.getvalue()
+
+
+def _entries(buffer) -> list[tuple[CompactDFA, str | None]]:
+    magic, version, count = FILE_HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("not a binary FA file")
+    if version != VERSION:
+        raise ValueError(f"unsupported binary FA version {version}")
+    offsets = np.frombuffer(buffer, dtype="<u8", count=count, offset=FILE_HEADER.size).tolist()
+    res = []
+    for offset in offsets:
+        n_states, n_symbols, init_index, flags, alphabet_size, digest = ENTRY_HEADER.unpack_from(buffer, offset)
+        offset += ENTRY_HEADER.size
+        alphabet = json.loads(bytes(buffer[offset:offset + alphabet_size]))
+        offset += _aligned(alphabet_size)
+        # the table is a view into the buffer, nothing is copied
+        table = np.frombuffer(buffer, dtype="<u4", count=n_states * n_symbols, offset=offset)
+        table = table.view(np.int32).reshape(n_states, n_symbols)
+        offset += 4 * n_states * n_symbols
+        finals = np.frombuffer(buffer, dtype=np.uint8, count=-(-n_states // 8), offset=offset)
+        final_mask = np.unpackbits(finals, count=n_states).astype(bool)
+        res.append((CompactDFA(table, final_mask, alphabet, init_index), digest.hex() if flags & HAS_HASH else None))
+    return res
+
+
+def loads(data: bytes | bytearray | memoryview) -> list[CompactDFA]:
+    instrument.count("phase0.bytes_parsed", len(data))
+    return [fa for fa, _ in _entries(data)]
+
+
+def load(path: str) -> list[CompactDFA]:
+    # the arrays keep the mapping alive; it is unmapped once the last of them is collected
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(buffer)
+
+
+def hashes(data: bytes | bytearray | memoryview) -> list[str | None]:
+    return [digest for _, digest in _entries(data)]
+
+
+def json_to_binary(json_fa_list: list[str], with_hash: bool = True) -> bytes:
+    return dumps([CompactDFA.deserialize_json(json_fa) for json_fa in json_fa_list], with_hash)
+
+
+def binary_to_json(data: bytes | bytearray | memoryview) -> list[str]:
+    return [fa.serialize_json() for fa in loads(data)]
+
+
+def load_fa(data: str | bytes | bytearray | memoryview) -> DFA | CompactDFA:
+    # a JSON string, or a binary container holding a single FA
+    if not is_binary(data):
+        return DFA.deserialize_json(data)
+    fa_list = loads(data)
+    if len(fa_list) != 1:
+        raise ValueError(f"expected one FA, the binary container holds {len(fa_list)}")
+    return fa_list[0]
+
+
+def load_fa_list(data: list[str | bytes] | bytes | bytearray | memoryview) -> list[DFA | CompactDFA]:
+    # either a whole binary library or a list of JSON strings and single-FA binaries
+    if is_binary(data):
+        return list(loads(data))
+    res = []
+    for item in data:
+        res.extend(loads(item) if is_binary(item) else [CompactDFA.deserialize_json(item)])
+    return res
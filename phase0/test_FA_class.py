@@ -0,0 +1,257 @@
+import unittest
+import io
+import itertools
+import json
+import re
+import os
+import tempfile
+import numpy as np
+import FA_class
+import fa_binary
+
+
+class TestCompactDFA(unittest.TestCase):
+    def test(self):
+        with open(os.path.join("../data/module3Test", "1.json"), 'r') as file:
+            json_fa = file.read()
+
+        fa = FA_class.DFA.deserialize_json(json_fa)
+        compact = fa.compact()
+
+        self.assertEqual(compact.table.shape, (len(fa.states), len(fa.alphabet)))
+        self.assertEqual(str(compact.table.dtype), 'int32')
+        self.assertEqual(len(compact.final_states), len(fa.final_states))
+
+        for row, state in enumerate(fa.states):
+            view = compact.states[row]
+            self.assertEqual(fa.is_final(state), compact.is_final(view))
+            for symbol in fa.alphabet:
+                self.assertEqual(fa.states.index(state.transitions[symbol]), view.transitions[symbol].id)
+
+        self.assertEqual(compact.init_state, compact.get_state_by_id(fa.states.index(fa.init_state)))
+        self.assertIsNone(compact.get_state_by_id(len(fa.states)))
+        self.assertEqual(FA_class.CompactDFA.deserialize_json(compact.serialize_json()).table.tolist(),
+                         compact.table.tolist())
+
+    @staticmethod
+    def raster(fa: 'FA_class.CompactDFA', depth: int) -> np.ndarray:
+        # pixel (row, column) is the address of 2 * row bit + column bit per level, most significant first
+        size = 1 << depth
+        image = np.zeros((size, size), dtype=np.uint8)
+        for row in range(size):
+            for column in range(size):
+                state = fa.init_index
+                for level in range(depth - 1, -1, -1):
+                    state = fa.step(state, str(2 * (row >> level & 1) + (column >> level & 1)))
+                image[row, column] = fa.final_mask[state]
+        return image
+
+    def test_transform_and_crop(self):
+        compact = FA_class.CompactDFA.load_json(os.path.join("../data/module3Test", "2.json"))
+        image = self.raster(compact, 7)
+        self.assertTrue(0 < image.sum() < image.size)
+        expected = {
+            "identity": image,
+            "rotate90": np.rot90(image, -1),
+            "rotate180": np.rot90(image, 2),
+            "rotate270": np.rot90(image, 1),
+            "flip_horizontal": np.flip(image, 1),
+            "flip_vertical": np.flip(image, 0),
+            "transpose": image.T,
+            "anti_transpose": np.rot90(image, 2).T,
+        }
+        self.assertEqual(sorted(expected), sorted(FA_class.TRANSFORMS))
+        for name, transformed in expected.items():
+            self.assertTrue(np.array_equal(self.raster(compact.transform(name), 7), transformed), name)
+
+        self.assertEqual(FA_class.CompactDFA.depth_of(128), 7)
+        for resolution in (0, -4, 96):
+            self.assertRaises(ValueError, FA_class.CompactDFA.depth_of, resolution)
+        self.assertEqual(FA_class.CompactDFA.pixel_address(5, 3, 3), "213")
+        self.assertEqual(compact.quadrant_table().tolist(), compact.table.tolist())
+
+        windows = {"": image, "0": image[:64, :64], "1": image[:64, 64:], "3": image[64:, 64:],
+                   "12": image[32:64, 64:96], "301": image[64:80, 80:96]}
+        for address, window in windows.items():
+            self.assertTrue(np.array_equal(self.raster(compact.crop(address), 7 - len(address)), window), address)
+
+
+class TestJson(unittest.TestCase):
+    def test(self):
+        for json_file in sorted(os.listdir("../data/module3Test")):
+            if not json_file.endswith(".json"):
+                continue
+            json_path = os.path.join("../data/module3Test", json_file)
+            with open(json_path, 'r') as file:
+                json_fa = file.read()
+
+            fa = FA_class.DFA.deserialize_json(json_fa)
+            with open(json_path, 'r') as file:
+                streamed = FA_class.DFA.load_json(file)
+
+            self.assertTrue(all(isinstance(state.id, int) for state in fa.states))
+            self.assertEqual(fa.get_state_by_id(0), fa.init_state)
+            self.assertEqual(json.loads(fa.serialize_json()), json.loads(json_fa))
+            self.assertEqual(streamed.serialize_json(), fa.serialize_json())
+
+            nfa = FA_class.NFA.convert_DFA_instanse_to_NFA_instanse(fa)
+            self.assertEqual(FA_class.NFA.deserialize_json(nfa.serialize_json()).serialize_json(), nfa.serialize_json())
+
+    def test_chunk_boundaries(self):
+        text = ('{"a": 1.25, "b": [1,2], "c": -3, "d": 6.02e23, "e": -1.5E-7, "f" : 10 ,'
+                '"g": {"h": [true, null, "x,y}"]}, "i": 0.125}')
+        expected = list(json.loads(text).items())
+        for chunk_size in range(1, 17):
+            members = list(FA_class.iter_json_object(io.StringIO(text), chunk_size))
+            self.assertEqual(members, expected, chunk_size)
+
+
+class TestBinary(unittest.TestCase):
+    def test(self):
+        json_files = sorted(file for file in os.listdir("../data/module3Test") if file.endswith(".json"))
+        json_fa_list = []
+        for json_file in json_files:
+            with open(os.path.join("../data/module3Test", json_file), 'r') as file:
+                json_fa_list.append(file.read())
+
+        data = fa_binary.json_to_binary(json_fa_list)
+        self.assertTrue(fa_binary.is_binary(data))
+        self.assertFalse(fa_binary.is_binary(json_fa_list[0]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.tlafa")
+            with open(path, 'wb') as file:
+                file.write(data)
+            fa_list = fa_binary.load(path)
+
+            self.assertEqual(len(fa_list), len(json_fa_list))
+            for fa, json_fa, digest in zip(fa_list, json_fa_list, fa_binary.hashes(data)):
+                expected = FA_class.CompactDFA.deserialize_json(json_fa)
+                self.assertFalse(fa.table.flags['OWNDATA'])
+                self.assertEqual(fa.table.tolist(), expected.table.tolist())
+                self.assertEqual(fa.final_mask.tolist(), expected.final_mask.tolist())
+                self.assertEqual(fa.init_index, expected.init_index)
+                self.assertEqual(digest, expected.canonical_hash())
+            del fa_list
+
+        for json_fa, back in zip(json_fa_list, fa_binary.binary_to_json(data)):
+            self.assertEqual(json.loads(back), json.loads(json_fa))
+
+
+class TestMinimize(unittest.TestCase):
+    def test(self):
+        # an image of a 2x2 checkerboard with a redundant copy of every state
+        fa = FA_class.DFA()
+        fa.alphabet = ['0', '1', '2', '3']
+        states = [fa.add_state(i) for i in range(6)]
+        fa.assign_initial_state(states[0])
+        for i in (2, 5):
+            fa.add_final_state(states[i])
+        for i, targets in enumerate([[1, 4, 4, 1], [2, 5, 2, 5], [2, 2, 2, 2], [3, 3, 3, 3], [3, 3, 3, 3],
+                                     [5, 5, 5, 5]]):
+            for symbol, target in zip(fa.alphabet, targets):
+                fa.add_transition(states[i], states[target], symbol)
+
+        minimal = fa.minimize()
+
+        self.assertEqual(len(minimal.states), 4)
+        self.assertEqual(minimal.serialize_json(), minimal.minimize().serialize_json())
+        self.assertEqual(fa.canonical_hash(), minimal.canonical_hash())
+        for address in ["00", "01", "03", "10", "2", "23"]:
+            state = fa.init_state
+            minimal_state = minimal.init_state
+            for char in address:
+                state = state.transitions[char]
+                minimal_state = minimal_state.transitions[char]
+            self.assertEqual(fa.is_final(state), minimal.is_final(minimal_state))
+
+        fa.final_states.remove(states[5])
+        self.assertNotEqual(fa.canonical_hash(), minimal.canonical_hash())
+
+
+class TestProduct(unittest.TestCase):
+    @staticmethod
+    def picture(rows: list[str]) -> 'FA_class.CompactDFA':
+        # a 2x2 picture: quadrants 0..3 go to the black or the white sink
+        fa = FA_class.DFA()
+        fa.alphabet = ['0', '1', '2', '3']
+        init, black, white = fa.add_state(0), fa.add_state(1), fa.add_state(2)
+        fa.assign_initial_state(init)
+        fa.add_final_state(black)
+        for symbol, pixel in zip(fa.alphabet, ''.join(rows)):
+            fa.add_transition(init, black if pixel == '1' else white, symbol)
+            fa.add_transition(black, black, symbol)
+            fa.add_transition(white, white, symbol)
+        return fa
+
+    def pixels(self, fa) -> str:
+        return ''.join('1' if fa.is_final(fa.init_state.transitions[symbol]) else '0' for symbol in '0123')
+
+    def test(self):
+        a = self.picture(["11", "00"])
+        b = self.picture(["10", "10"])
+
+        self.assertEqual(self.pixels(a.intersection(b)), "1000")
+        self.assertEqual(self.pixels(a.union(b, minimize=True)), "1110")
+        self.assertEqual(self.pixels(a.symmetric_difference(b)), "0110")
+        self.assertEqual(self.pixels(a.difference(b)), "0100")
+        self.assertEqual(self.pixels(a.complement()), "0011")
+
+        self.assertTrue(a.intersection(b).is_subset(a, 1))
+        self.assertFalse(a.is_subset(b, 1))
+        self.assertTrue(a.is_equivalent(a.union(a.intersection(b))))
+        self.assertFalse(a.is_equivalent(b))
+
+
+class TestNFA(unittest.TestCase):
+    @staticmethod
+    def word(text: str) -> 'FA_class.NFA':
+        fa = FA_class.NFA()
+        fa.alphabet = ['0', '1']
+        state = fa.add_state(0)
+        fa.assign_initial_state(state)
+        for char in text:
+            next_state = fa.add_state(len(fa.states))
+            fa.add_transition(state, next_state, char)
+            state = next_state
+        fa.add_final_state(state)
+        return fa
+
+    def test(self):
+        # (01 | 1)* 0
+        nfa = FA_class.NFA.concat(FA_class.NFA.star(FA_class.NFA.union(self.word("01"), self.word("1"))),
+                                  self.word("0"))
+        nfa = FA_class.NFA.deserialize_json(nfa.serialize_json())
+        dfa = nfa.determinize()
+        minimal = nfa.determinize(minimize=True)
+        for length in range(7):
+            for word in itertools.product('01', repeat=length):
+                word = ''.join(word)
+                expected = word.endswith('0') and re.fullmatch('(01|1)*', word[:-1]) is not None
+                self.assertEqual(nfa.accepts(word), expected)
+                for fa in (dfa, minimal):
+                    state = fa.init_state
+                    for char in word:
+                        state = state.transitions[char]
+                    self.assertEqual(fa.is_final(state), expected)
+        self.assertEqual(len(minimal.states), 3)
+        self.assertTrue(dfa.is_equivalent(minimal))
+
+    def test_accepts_cache(self):
+        nfa = self.word("01")
+        self.assertTrue(nfa.accepts("01"))
+        core = nfa._bitset_core()
+        self.assertFalse(nfa.accepts("0"))
+        self.assertIs(nfa._bitset_core(), core)
+        # editing the machine drops the cached tables
+        nfa.add_final_state(nfa.states[1])
+        self.assertTrue(nfa.accepts("0"))
+        nfa.add_epsilon_transition(nfa.init_state, nfa.states[2])
+        self.assertTrue(nfa.accepts(""))
+        nfa.alphabet = ['0', '1', '2']
+        nfa.add_transition(nfa.init_state, nfa.states[2], '2')
+        self.assertTrue(nfa.accepts("2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
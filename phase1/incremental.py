@@ -0,0 +1,111 @@
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA, State, QUADRANT_BITS
+from phase1.module1 import QuadtreeTable, split_into_fourths
+from utils.image_types import imageType
+
+
+def intern_dfa(table: QuadtreeTable, fa: DFA | CompactDFA, resolution: int) -> int:
+    # the quadtree node of the picture fa draws at this resolution, one table lookup per (state, depth)
+    depth = CompactDFA.depth_of(resolution)
+    fa = CompactDFA.from_dfa(fa)
+    transitions = fa.quadrant_table().tolist()
+    final = fa.final_mask.tolist()
+    nodes: dict[tuple[int, int], int] = {}
+
+    def node(state: int, depth: int) -> int:
+        if depth == 0:
+            return QuadtreeTable.BLACK if final[state] else QuadtreeTable.WHITE
+        res = nodes.get((state, depth))
+        if res is None:
+            res = table.intern(tuple(node(next_state, depth - 1) for next_state in transitions[state]))
+            nodes[(state, depth)] = res
+        return res
+
+    return node(fa.init_index, depth)
+
+
+class IncrementalPicture:
+    # a picture kept as a root in a QuadtreeTable; edits re-intern only the quadrants they touch
+    def __init__(self, image: imageType | None = None, table: QuadtreeTable | None = None) -> None:
+        self.table = QuadtreeTable() if table is None else table
+        self.root = QuadtreeTable.WHITE
+        self.resolution = 1
+        self.table.holders.add(self)
+        if image is not None:
+            pixels = np.asarray(image)
+            self.root = self.table.build(pixels)
+            self.resolution = pixels.shape[0]
+
+    @staticmethod
+    def from_dfa(fa: DFA | CompactDFA, resolution: int, table: QuadtreeTable | None = None) -> 'IncrementalPicture':
+        picture = IncrementalPicture(table=table)
+        picture.root = intern_dfa(picture.table, fa, resolution)
+        picture.resolution = resolution
+        return picture
+
+    def update(self, top: int, left: int, pixels: imageType) -> None:
+        patch = np.asarray(pixels)
+        height, width = patch.shape
+        if top < 0 or left < 0 or top + height > self.resolution or left + width > self.resolution:
+            raise ValueError(f"a {height}x{width} patch at ({top}, {left}) does not fit a {self.resolution} picture")
+        if height > 0 and width > 0:
+            self.root = self._replace(self.root, self.resolution, 0, 0, top, left, patch)
+
+    def _replace(self, node: int, size: int, row: int, col: int, top: int, left: int, patch: np.ndarray) -> int:
+        height, width = patch.shape
+        if row >= top + height or col >= left + width or row + size <= top or col + size <= left:
+            return node
+        if top <= row and left <= col and row + size <= top + height and col + size <= left + width:
+            return self.table.build(patch[row - top:row - top + size, col - left:col - left + size])
+        half = size // 2
+        children = self.table.children[node]
+        return self.table.intern(tuple(
+            self._replace(children[quadrant], half, row + row_bit * half, col + col_bit * half, top, left, patch)
+            for quadrant, (row_bit, col_bit) in enumerate(QUADRANT_BITS)))
+
+    def update_mask(self, image: imageType, mask: imageType) -> None:
+        # takes the pixels of image wherever mask is set
+        self.root = self._replace_masked(self.root, np.asarray(image), np.asarray(mask, dtype=bool))
+
+    def _replace_masked(self, node: int, image: np.ndarray, mask: np.ndarray) -> int:
+        if not mask.any():
+            return node
+        if mask.all():
+            return self.table.build(image)
+        children = self.table.children[node]
+        image_parts = split_into_fourths(image)
+        mask_parts = split_into_fourths(mask)
+        return self.table.intern(tuple(self._replace_masked(children[quadrant], image_parts[quadrant],
+                                                            mask_parts[quadrant])
+                                       for quadrant in range(4)))
+
+    def collect(self, roots: list[int] = ()) -> list[int]:
+        # forgets the quadrants earlier edits left behind; every picture on the shared table is
+        # kept and renumbered, other roots into it (encode_sequence) must be passed and are
+        # returned renumbered
+        return self.table.collect(list(roots))
+
+    def to_dfa(self) -> DFA:
+        return self.table.to_dfa(self.root)
+
+    def to_compact(self) -> CompactDFA:
+        return self.table.to_compact(self.root)
+
+
+def update_dfa(fa: DFA | CompactDFA, resolution: int, top: int, left: int, pixels: imageType) -> DFA:
+    picture = IncrementalPicture.from_dfa(fa, resolution)
+    picture.update(top, left, pixels)
+    return picture.to_dfa()
+
+
+def encode_sequence(frames: list[imageType], table: QuadtreeTable | None = None) -> tuple[QuadtreeTable, list[int]]:
+    table = QuadtreeTable() if table is None else table
+    return table, [table.build(frame) for frame in frames]
+
+
+def sequence_to_dfa(table: QuadtreeTable, roots: list[int]) -> tuple[DFA, list[State]]:
+    # one automaton for all frames; init_state draws the first frame and the returned
+    # states are the initial states of every frame, equal frames sharing one
+    dfa = table.to_dfa(*roots)
+    numbers = {root: number for number, root in enumerate(dict.fromkeys(roots))}
+    return dfa, [dfa.states[numbers[root]] for root in roots]
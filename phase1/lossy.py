@@ -0,0 +1,133 @@
+from collections.abc import Sequence
+import numpy as np
+from phase0.FA_class import CompactDFA
+from phase1.module1 import solve_compact
+from utils.image_types import imageType
+
+# number of set bits of every byte
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+
+class Approximation:
+    def __init__(self, fa: CompactDFA, image: np.ndarray, error: int) -> None:
+        # image is the picture fa recognises exactly; error counts its pixels that differ from the input
+        self.fa = fa
+        self.image = image
+        self.error = error
+
+    @property
+    def states(self) -> int:
+        return len(self.fa.table)
+
+    @property
+    def error_rate(self) -> float:
+        return self.error / self.image.size
+
+
+def _tolerances(tolerance: float | Sequence[float], depth: int) -> list[float]:
+    # one Hamming tolerance per level, as a fraction of the block area; level 1 are the 2x2 blocks
+    if isinstance(tolerance, (int, float)):
+        return [float(tolerance)] * depth
+    return [float(value) for value in tolerance[:depth]] + [0.0] * (depth - len(tolerance))
+
+
+def _blocks(pixels: np.ndarray, side: int) -> np.ndarray:
+    count = pixels.shape[0] // side
+    return pixels.reshape(count, side, count, side).swapaxes(1, 2).reshape(count * count, side * side)
+
+
+def _unblocks(blocks: np.ndarray, side: int, resolution: int) -> np.ndarray:
+    count = resolution // side
+    return blocks.reshape(count, count, side, side).swapaxes(1, 2).reshape(resolution, resolution)
+
+
+def _candidates(bits: np.ndarray, counts: np.ndarray, limit: int, bands: int, width: int,
+                rng: np.random.Generator) -> np.ndarray:
+    # (source, target) pairs of distinct blocks that share a bit-sampling signature in some band;
+    # a band samples enough bits that blocks `limit` apart still collide with probability 1/2,
+    # and each block is only paired with the `width` most frequent blocks of its bucket
+    area = bits.shape[1]
+    if limit >= area:
+        sampled = 0
+    else:
+        sampled = int(min(area, max(1, np.log(0.5) / np.log1p(-limit / area))))
+    by_frequency = np.lexsort((np.arange(len(counts)), -counts))
+    bits = bits[by_frequency]
+    pairs = []
+    for _ in range(bands if sampled else 1):
+        if sampled:
+            keys = np.packbits(bits[:, rng.choice(area, size=sampled, replace=False)], axis=1)
+            keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1]))).ravel()
+            _, bucket = np.unique(keys, return_inverse=True)
+        else:
+            bucket = np.zeros(len(bits), dtype=np.int64)
+        # members of a bucket stay in frequency order, rank is the position within the bucket
+        order = np.argsort(bucket, kind='stable')
+        bucket = bucket[order]
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        for target_rank in range(width):
+            source = np.flatnonzero(rank > target_rank)
+            pairs.append(np.stack([order[source], order[source - rank[source] + target_rank]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.concatenate(pairs)
+    return by_frequency[np.unique(pairs, axis=0)]
+
+
+def approximate(image: imageType, tolerance: float | Sequence[float] = 0.0, budget: int | None = None,
+                bands: int = 8, width: int = 4, seed: int = 0) -> tuple[np.ndarray, int]:
+    # merges similar blocks bottom-up, level by level: a block may be replaced by a more frequent
+    # block of the same level within the level's tolerance, cheapest merges first, until the
+    # pixel budget is spent; returns the approximated picture and its pixel error
+    pixels = (np.asarray(image) == 1).astype(np.uint8)
+    resolution = pixels.shape[0]
+    if pixels.shape != (resolution, resolution) or resolution & (resolution - 1) != 0:
+        raise ValueError(f"image must be square with a power-of-two side, got {pixels.shape}")
+    depth = resolution.bit_length() - 1
+    rng = np.random.default_rng(seed)
+    res = pixels.copy()
+    spent = 0
+    for level, fraction in enumerate(_tolerances(tolerance, depth), start=1):
+        side = 1 << level
+        limit = int(fraction * side * side)
+        if limit == 0 or (budget is not None and spent >= budget):
+            continue
+        blocks = _blocks(res, side)
+        packed = np.packbits(blocks, axis=1)
+        keys = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+        _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        if len(counts) < 2:
+            continue
+        distinct = packed[first]
+        pairs = _candidates(blocks[first], counts, limit, bands, width, rng)
+        source, target = pairs[:, 0], pairs[:, 1]
+        distance = POPCOUNT[distinct[source] ^ distinct[target]].sum(axis=1)
+        keep = distance <= limit
+        source, target, distance = source[keep], target[keep], distance[keep]
+        cost = distance * counts[source]
+        merged_into = np.arange(len(counts))
+        has_members = np.zeros(len(counts), dtype=bool)
+        for i in np.lexsort((distance, cost)).tolist():
+            j, k = int(source[i]), int(target[i])
+            if merged_into[j] != j or has_members[j] or merged_into[k] != k:
+                continue
+            if budget is not None and spent + int(cost[i]) > budget:
+                break
+            merged_into[j] = k
+            has_members[k] = True
+            spent += int(cost[i])
+        changed = merged_into[inverse] != inverse
+        if changed.any():
+            blocks[changed] = blocks[first[merged_into[inverse[changed]]]]
+            res = _unblocks(blocks, side, resolution)
+    return res, int((res != pixels).sum())
+
+
+def solve_lossy(image: imageType, tolerance: float | Sequence[float] | None = None, budget: int | None = None,
+                **options) -> Approximation:
+    # without a tolerance a budget alone bounds the error, so any two blocks may merge
+    if tolerance is None:
+        tolerance = 1.0 if budget is not None else 0.0
+    approximated, error = approximate(image, tolerance, budget, **options)
+    return Approximation(solve_compact(approximated), approximated, error)
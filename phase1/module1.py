@@ -1,96 +1,209 @@
+import weakref
+from itertools import product
 from typing import TypeVar
-from phase0.FA_class import DFA
-from utils.utils import imageType, imageIndexType
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA
+from utils import instrument
+from utils.image_types import imageType, imageIndexType
 
 T = TypeVar('T', imageType, imageIndexType)
 
 
-def split_into_fourths(image: T) -> list[T] | None:
-    height = len(image)
-    width = len(image[0])
+def split_into_fourths(image: T) -> list[np.ndarray] | None:
+    # the quadrants are views into the (possibly converted) array, nothing is copied
+    array = np.asarray(image)
+    height, width = array.shape[:2]
 
     part_height = height // 2
     part_width = width // 2
 
-    part1: T = []
-    part2: T = []
-    part3: T = []
-    part4: T = []
-
     if part_height <= 0 and part_width <= 0:
         return None
 
-    for i in range(height):
-        part11 = []
-        part21 = []
-        part31 = []
-        part41 = []
-        for j in range(width):
-            if i < part_height and j < part_width:
-                part11.append(image[i][j])
-            elif i < part_height and j >= part_width:
-                part21.append(image[i][j])
-            elif i >= part_height and j < part_width:
-                part31.append(image[i][j])
-            else:
-                part41.append(image[i][j])
-        if len(part11) >= 1:
-            part1.append(part11)
-        if len(part21) >= 1:
-            part2.append(part21)
-        if len(part31) >= 1:
-            part3.append(part31)
-        if len(part41) >= 1:
-            part4.append(part41)
-
-    return [part1, part2, part3, part4]
-
-
-def convert_into_bit_address(image: imageType, prefix: str = ""):
+    return [array[:part_height, :part_width], array[:part_height, part_width:],
+            array[part_height:, :part_width], array[part_height:, part_width:]]
+
+
+def convert_into_bit_address(image: imageType, prefix: str = "") -> list[str]:
     res = list[str]()
-    if image is None or len(image) == 0:
+    if image is None:
         return res
-    if len(image) == 1 and len(image[0]) == 1:
-        return [prefix] if image[0][0] == 1 else res
-    parts = split_into_fourths(image)
-    for i in range(4):
-        res += convert_into_bit_address(parts[i], prefix + str(i))
+    _collect_bit_address(np.asarray(image) == 1, prefix, res)
+    instrument.count("phase1.addresses", len(res))
     return res
 
 
+def _collect_bit_address(black: np.ndarray, prefix: str, res: list[str]) -> None:
+    if black.size == 0 or not black.any():
+        return
+    height, width = black.shape
+    if height == 1 and width == 1:
+        res.append(prefix)
+        return
+    if height == width and height & (height - 1) == 0 and black.all():
+        depth = height.bit_length() - 1
+        res.extend(prefix + ''.join(suffix) for suffix in product('0123', repeat=depth))
+        return
+    parts = split_into_fourths(black)
+    for i in range(4):
+        _collect_bit_address(parts[i], prefix + str(i), res)
+
+
+class QuadtreeTable:
+    # hash-consing table of quadtree nodes: ids 0 and 1 are the white and black
+    # pixels, every other id is keyed by the ids of its four quadrants
+    WHITE = 0
+    BLACK = 1
+
+    def __init__(self) -> None:
+        self.children: list[tuple[int, int, int, int] | None] = [None, None]
+        self.index: dict[tuple[int, int, int, int], int] = {}
+        # objects with a `root` attribute (phase1.incremental pictures) that collect keeps alive
+        # and renumbers along with the roots it is given
+        self.holders: weakref.WeakSet = weakref.WeakSet()
+
+    def intern(self, children: tuple[int, int, int, int]) -> int:
+        node = self.index.get(children)
+        if node is None:
+            node = len(self.children)
+            self.children.append(children)
+            self.index[children] = node
+        return node
+
+    def build(self, image: imageType) -> int:
+        pixels = np.asarray(image)
+        height, width = pixels.shape[:2]
+        if height != width or height & (height - 1) != 0:
+            raise ValueError(f"image must be square with a power-of-two side, got {height}x{width}")
+        # each level is kept as dense ids into `nodes`, the table ids of its distinct quadrants
+        instrument.count("phase1.pixels", pixels.size)
+        nodes = np.array([QuadtreeTable.WHITE, QuadtreeTable.BLACK], dtype=np.int64)
+        level = (pixels == 1).astype(np.int64)
+        while level.shape[0] > 1:
+            nodes, level = self.reduce(nodes, level)
+        return int(nodes[level[0, 0]])
+
+    def merge(self, ids: np.ndarray) -> int:
+        # the root of a square power-of-two grid of node ids, e.g. the roots of image tiles
+        nodes, level = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        level = level.reshape(np.shape(ids))
+        while level.shape[0] > 1:
+            nodes, level = self.reduce(nodes, level)
+        return int(nodes[level[0, 0]])
+
+    def reduce(self, nodes: np.ndarray, level: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # one quadtree level up: every 2x2 block of dense ids becomes the dense id of its parent
+        size = len(nodes)
+        top_keys, top = _dedup(level[0::2, 0::2] * size + level[0::2, 1::2], size * size)
+        bottom_keys, bottom = _dedup(level[1::2, 0::2] * size + level[1::2, 1::2], size * size)
+        keys, parent = _dedup(top * len(bottom_keys) + bottom, len(top_keys) * len(bottom_keys))
+        top_keys = top_keys[keys // len(bottom_keys)]
+        bottom_keys = bottom_keys[keys % len(bottom_keys)]
+        quads = np.stack([top_keys // size, top_keys % size, bottom_keys // size, bottom_keys % size], axis=1)
+        created = len(self.children)
+        parents = [self.intern(tuple(children)) for children in nodes[quads].tolist()]
+        if instrument.active:
+            # blocks collapsed by the level dedup, then the table lookups that found or created a node
+            instrument.count("phase1.dedup_blocks", level.size // 4 - len(parents))
+            instrument.count("phase1.intern_misses", len(self.children) - created)
+            instrument.count("phase1.intern_hits", len(parents) - len(self.children) + created)
+        return np.array(parents, dtype=np.int64), parent
+
+    def bfs_order(self, root: int, *more_roots: int) -> tuple[list[int], dict[int, int]]:
+        # states are numbered in breadth-first order of first appearance, as solve always did;
+        # extra roots (frames sharing this table) are numbered right after the first one
+        order = list(dict.fromkeys((root,) + more_roots))
+        numbers = {node: number for number, node in enumerate(order)}
+        for node in order:
+            children = self.children[node]
+            if children is None:
+                continue
+            for child in children:
+                if child not in numbers:
+                    numbers[child] = len(order)
+                    order.append(child)
+        return order, numbers
+
+    def to_dfa(self, root: int, *more_roots: int) -> DFA:
+        order, numbers = self.bfs_order(root, *more_roots)
+        dfa = DFA()
+        dfa.alphabet = ['0', '1', '2', '3']
+        states = [dfa.add_state(number) for number in range(len(order))]
+        dfa.assign_initial_state(states[0])
+        for state, node in zip(states, order):
+            children = self.children[node]
+            if children is None:
+                if node == QuadtreeTable.BLACK:
+                    dfa.add_final_state(state)
+                for symbol in dfa.alphabet:
+                    dfa.add_transition(state, state, symbol)
+                continue
+            for symbol, child in zip(dfa.alphabet, children):
+                dfa.add_transition(state, states[numbers[child]], symbol)
+        return dfa
+
+    def to_compact(self, root: int, *more_roots: int) -> CompactDFA:
+        order, numbers = self.bfs_order(root, *more_roots)
+        table = np.empty((len(order), 4), dtype=np.int32)
+        for number, node in enumerate(order):
+            children = self.children[node]
+            table[number] = number if children is None else [numbers[child] for child in children]
+        final_mask = np.zeros(len(order), dtype=bool)
+        if QuadtreeTable.BLACK in numbers:
+            final_mask[numbers[QuadtreeTable.BLACK]] = True
+        return CompactDFA(table, final_mask, ['0', '1', '2', '3'], 0)
+
+    def collect(self, roots: list[int]) -> list[int]:
+        # drops every node that neither a given root nor a registered holder reaches, renumbers
+        # the holders and returns the new ids of the roots; any other id into this table is
+        # invalid afterwards. A parent is always interned after its children, so ascending ids
+        # are a bottom-up order
+        holders = list(self.holders)
+        live = list(roots) + [holder.root for holder in holders]
+        order, _ = self.bfs_order(*live) if live else ([], {})
+        old_children = self.children
+        self.children = [None, None]
+        self.index = {}
+        renamed = {QuadtreeTable.WHITE: QuadtreeTable.WHITE, QuadtreeTable.BLACK: QuadtreeTable.BLACK}
+        for node in sorted(order):
+            if node not in renamed:
+                renamed[node] = self.intern(tuple(renamed[child] for child in old_children[node]))
+        for holder in holders:
+            holder.root = renamed[holder.root]
+        return [renamed[root] for root in roots]
+
+
+def _dedup(keys: np.ndarray, space: int) -> tuple[np.ndarray, np.ndarray]:
+    # sorted distinct keys and the dense index of every key; counting instead of sorting when the key space is small
+    if space <= max(4 * keys.size, 1 << 16):
+        seen = np.zeros(space, dtype=bool)
+        seen[keys] = True
+        rank = np.cumsum(seen) - 1
+        return np.flatnonzero(seen), rank[keys]
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    return distinct, inverse.reshape(keys.shape)
+
+
+@instrument.timed("phase1.solve")
 def solve(image: imageType) -> 'DFA':
-    diction = {}
-    dfa = DFA()
-    initState = dfa.add_state(0)
-    dfa.assign_initial_state(initState)
-    dfa.alphabet = ['0', '1', '2', '3']
-    i = 0
-    j = 0
-    diction[initState] = image
-    while True:
-        k = 0
-        parts = split_into_fourths(diction[dfa.get_state_by_id(i)])
-        if parts is None:
-            if diction[dfa.get_state_by_id(i)][0] == [1]:
-                dfa.add_final_state(dfa.get_state_by_id(i))
-            for ik in range(4):
-                dfa.add_transition(dfa.get_state_by_id(i), dfa.get_state_by_id(i), dfa.alphabet[ik])
-        else:
-            for part in parts:
-                if part in diction.values():
-                    keyToState = next((k for k, v in diction.items() if v == part), None)
-                    dfa.add_transition(dfa.get_state_by_id(i), keyToState, dfa.alphabet[k])
-                else:
-                    j += 1
-                    newState = dfa.add_state(j)
-                    diction[newState] = part
-                    dfa.add_transition(dfa.get_state_by_id(i), newState, dfa.alphabet[k])
-                k += 1
-        if i == j:
-            break
-        else:
-            i += 1
-    return dfa
+    table = QuadtreeTable()
+    with instrument.timer("phase1.build"):
+        root = table.build(image)
+    with instrument.timer("phase1.to_dfa"):
+        fa = table.to_dfa(root)
+    instrument.count("phase1.states", len(fa.states))
+    return fa
+
+
+@instrument.timed("phase1.solve_compact")
+def solve_compact(image: imageType) -> CompactDFA:
+    table = QuadtreeTable()
+    with instrument.timer("phase1.build"):
+        root = table.build(image)
+    with instrument.timer("phase1.to_compact"):
+        fa = table.to_compact(root)
+    instrument.count("phase1.states", len(fa.table))
+    return fa
 
 
 if __name__ == "__main__":
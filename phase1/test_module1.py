@@ -1,7 +1,15 @@
 import unittest
+import json
 import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
 import module1
-from utils import utils
+import tiled
+import incremental
+import lossy
+from utils import instrument, utils
 
 
 class TestModule1(unittest.TestCase):
@@ -38,6 +46,167 @@ class TestModule1(unittest.TestCase):
                 else:
                     self.assertEqual('0', address[1][img_ind], '0')
 
+    def test_state_numbering(self):
+        image = [[1, 1, 1, 1],
+                 [1, 0, 1, 0],
+                 [0, 1, 0, 1],
+                 [1, 1, 1, 1]]
+
+        fa = module1.solve(image)
+
+        self.assertEqual(
+            fa.serialize_json(),
+            '{"states": ["q_0", "q_1", "q_2", "q_3", "q_4"], "initial_state": "q_0", "final_states": ["q_3"], '
+            '"alphabet": ["0", "1", "2", "3"], "q_0": {"0": "q_1", "1": "q_1", "2": "q_2", "3": "q_2"}, "q_1": {"0": '
+            '"q_3", "1": "q_3", "2": "q_3", "3": "q_4"}, "q_2": {"0": "q_4", "1": "q_3", "2": "q_3", "3": "q_3"}, '
+            '"q_3": {"0": "q_3", "1": "q_3", "2": "q_3", "3": "q_3"}, "q_4": {"0": "q_4", "1": "q_4", "2": "q_4", '
+            '"3": "q_4"}}'
+        )
+        self.assertRaises(ValueError, module1.solve, [[1, 0, 1], [0, 1, 0], [1, 0, 1]])
+
+    def test_batch_loading(self):
+        paths, images = utils.load_binary_images("../data/module1Test", 64)
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         sorted(file for file in os.listdir("../data/module1Test") if file.endswith((".jpg", ".png"))))
+        self.assertEqual(images.shape, (5, 64, 64))
+        self.assertEqual(images.dtype, 'uint8')
+        for path, image in zip(paths, images):
+            self.assertEqual(image.tolist(), utils.convert_pictures_to_gray_scale_and_binary_array(path, 64))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            utils.load_binary_images("../data/module1Test/*.png", 64, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 5)
+            for path, packed in utils.iter_binary_images(paths, 64, packed=True, cache_dir=cache_dir):
+                self.assertEqual(packed.shape, (64, 8))
+                self.assertTrue((np.unpackbits(packed, axis=1) == images[paths.index(path)]).all())
+
+    def test_lossy(self):
+        _, images = utils.load_binary_images("../data/module3Test", 128)
+        for image in images:
+            exact = module1.solve_compact(image)
+            approximation = lossy.solve_lossy(image)
+            self.assertEqual(approximation.error, 0)
+            self.assertEqual(approximation.states, len(exact.table))
+
+            approximation = lossy.solve_lossy(image, 0.05)
+            self.assertLess(approximation.states, len(exact.table))
+            self.assertEqual(approximation.error, int((approximation.image != image).sum()))
+            self.assertEqual(approximation.fa.canonical_hash(),
+                             module1.solve_compact(approximation.image).canonical_hash())
+
+            approximation = lossy.solve_lossy(image, budget=100)
+            self.assertLessEqual(approximation.error, 100)
+
+    def test_instrumentation(self):
+        image = [[1, 1, 1, 1],
+                 [1, 0, 1, 0],
+                 [0, 1, 0, 1],
+                 [1, 1, 1, 1]]
+        module1.solve(image)
+        self.assertFalse(instrument.active)
+        self.assertEqual(instrument.report()["timers"], {})
+
+        with tempfile.TemporaryDirectory() as directory:
+            profile = os.path.join(directory, "solve.prof")
+            with instrument.instrumented(memory=True, profile=profile) as report:
+                module1.solve(image)
+                module1.convert_into_bit_address(image)
+            self.assertTrue(os.path.getsize(profile) > 0)
+        self.assertFalse(instrument.active)
+        self.assertEqual(report["timers"]["phase1.solve"]["calls"], 1)
+        self.assertEqual(report["counters"]["phase1.states"], 5)
+        self.assertEqual(report["counters"]["phase1.addresses"], 12)
+        self.assertGreater(report["peak_memory_bytes"], 0)
+        with self.assertWarns(RuntimeWarning):
+            with instrument.instrumented(profile=os.path.join(directory, "missing", "solve.prof")):
+                module1.solve(image)
+
+    def test_instrumentation_inside_environment_session(self):
+        # a block inside a TLA_INSTRUMENT session reports only its own work, and the exit-time
+        # report still holds everything; TLA_PROFILE keeps the only profiler
+        code = ("import os, warnings, phase1.module1 as module1; from utils import instrument\n"
+                "image = [[1, 0], [0, 1]]\n"
+                "module1.solve(image)\n"
+                "with warnings.catch_warnings(record=True) as caught:\n"
+                "    warnings.simplefilter('always')\n"
+                "    with instrument.instrumented(profile=os.environ['BLOCK_PROFILE']) as report:\n"
+                "        module1.solve(image)\n"
+                "        module1.solve(image)\n"
+                "assert report['timers']['phase1.solve']['calls'] == 2, report\n"
+                "assert [warning.category for warning in caught] == [RuntimeWarning], caught\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {name: os.path.join(directory, name) for name in ("report.json", "all.prof", "block.prof")}
+            environment = dict(os.environ, PYTHONPATH=root, TLA_INSTRUMENT_REPORT=paths["report.json"],
+                               TLA_PROFILE=paths["all.prof"], BLOCK_PROFILE=paths["block.prof"])
+            subprocess.run([sys.executable, "-c", code], cwd=root, env=environment, check=True)
+            with open(paths["report.json"], 'r') as file:
+                report = json.load(file)
+            self.assertEqual(report["timers"]["phase1.solve"]["calls"], 3)
+            self.assertTrue(os.path.getsize(paths["all.prof"]) > 0)
+            self.assertFalse(os.path.exists(paths["block.prof"]))
+
+    def test_tiled(self):
+        binary_array = utils.convert_pictures_to_gray_scale_and_binary_array("../data/module1Test/1.png", 64)
+        expected = module1.solve(binary_array).serialize_json()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in ["image.npy", "image.raw", "image.packed"]:
+                path = os.path.join(directory, file_name)
+                tiled.save_binary_image(binary_array, path)
+                for tile in [8, 16, 64]:
+                    self.assertEqual(tiled.solve_tiled(path, tile).serialize_json(), expected)
+
+    def test_incremental(self):
+        binary_array = utils.convert_pictures_to_gray_scale_and_binary_array("../data/module1Test/2.png", 64)
+        edited = [row[:] for row in binary_array]
+        for i in range(10, 30):
+            for j in range(5, 12):
+                edited[i][j] = 1 - edited[i][j]
+
+        picture = incremental.IncrementalPicture.from_dfa(module1.solve(binary_array), 64)
+        picture.update(10, 5, [row[5:12] for row in edited[10:30]])
+        picture.collect()
+        self.assertEqual(picture.to_dfa().serialize_json(), module1.solve(edited).serialize_json())
+
+        table, roots = incremental.encode_sequence([binary_array, edited, binary_array])
+        fa, init_states = incremental.sequence_to_dfa(table, roots)
+        self.assertEqual(init_states[0], init_states[2])
+        self.assertEqual(init_states[0], fa.init_state)
+        self.assertLess(len(fa.states), len(module1.solve(binary_array).states) + len(module1.solve(edited).states))
+
+    def test_incremental_shared_table(self):
+        rng = np.random.default_rng(1)
+        frames = [(rng.random((32, 32)) < 0.5).astype(np.uint8) for _ in range(3)]
+        table = module1.QuadtreeTable()
+        first = incremental.IncrementalPicture(frames[0], table)
+        second = incremental.IncrementalPicture(frames[1], table)
+        _, roots = incremental.encode_sequence([frames[2]], table)
+
+        first.update(0, 0, frames[2][:16, :16])
+        size = len(table.children)
+        roots = first.collect(roots)
+        self.assertLess(len(table.children), size)
+
+        edited = frames[0].copy()
+        edited[:16, :16] = frames[2][:16, :16]
+        self.assertEqual(first.to_dfa().serialize_json(), module1.solve(edited).serialize_json())
+        self.assertEqual(second.to_dfa().serialize_json(), module1.solve(frames[1]).serialize_json())
+        self.assertEqual(table.to_dfa(roots[0]).serialize_json(), module1.solve(frames[2]).serialize_json())
+        second.update(8, 8, frames[0][8:24, 8:24])
+        edited = frames[1].copy()
+        edited[8:24, 8:24] = frames[0][8:24, 8:24]
+        self.assertEqual(second.to_dfa().serialize_json(), module1.solve(edited).serialize_json())
+
+    def test_lazy_imports(self):
+        # working on already binarized pictures must not load OpenCV or the plotting libraries
+        code = ("import sys, phase1.module1, phase1.lossy, phase1.incremental, phase1.tiled; "
+                "print(' '.join(name for name in ('cv2', 'matplotlib', 'networkx') if name in sys.modules))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.run([sys.executable, "-c", code], cwd=root, env=dict(os.environ, PYTHONPATH=root),
+                                 capture_output=True, text=True, check=True)
+        self.assertEqual(process.stdout.strip(), "")
+
 
 if __name__ == "__main__":
     unittest.main()
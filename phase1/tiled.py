@@ -0,0 +1,80 @@
+import os
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA
+from phase1.module1 import QuadtreeTable
+
+# binary pictures on disk: "npy" (np.save), "raw" (one uint8 per pixel, row-major)
+# or "packed" (np.packbits of every row)
+FORMATS = ("npy", "raw", "packed")
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return "npy"
+    if extension in (".packed", ".bits"):
+        return "packed"
+    return "raw"
+
+
+def save_binary_image(image, path: str, format: str | None = None) -> None:
+    format = format or detect_format(path)
+    pixels = (np.asarray(image) == 1).astype(np.uint8)
+    if format == "npy":
+        np.save(path, pixels)
+    elif format == "raw":
+        pixels.tofile(path)
+    elif format == "packed":
+        np.packbits(pixels, axis=1).tofile(path)
+    else:
+        raise ValueError(f"unknown binary image format {format!r}, expected one of {FORMATS}")
+
+
+class BinaryImageFile:
+    # a memory-mapped binary picture read one tile at a time
+    def __init__(self, path: str, format: str | None = None, resolution: int | None = None) -> None:
+        self.format = format or detect_format(path)
+        if self.format == "npy":
+            self.pixels = np.load(path, mmap_mode='r')
+            self.resolution = self.pixels.shape[0]
+            return
+        size = os.path.getsize(path)
+        if self.format == "raw":
+            self.resolution = resolution or int(round(size ** 0.5))
+            self.pixels = np.memmap(path, dtype=np.uint8, mode='r', shape=(self.resolution, self.resolution))
+        elif self.format == "packed":
+            self.resolution = resolution or int(round((size * 8) ** 0.5))
+            self.pixels = np.memmap(path, dtype=np.uint8, mode='r',
+                                    shape=(self.resolution, -(-self.resolution // 8)))
+        else:
+            raise ValueError(f"unknown binary image format {self.format!r}, expected one of {FORMATS}")
+
+    def tile(self, row: int, col: int, size: int) -> np.ndarray:
+        if self.format != "packed":
+            return np.asarray(self.pixels[row:row + size, col:col + size])
+        first = col // 8
+        bits = np.unpackbits(self.pixels[row:row + size, first:-(-(col + size) // 8)], axis=1)
+        return bits[:, col - first * 8:col - first * 8 + size]
+
+
+def build_tiled(table: QuadtreeTable, image: BinaryImageFile | np.ndarray, tile: int = 1024) -> int:
+    # every tile is reduced on its own, then the tile roots are merged through the same table
+    resolution = image.resolution if isinstance(image, BinaryImageFile) else image.shape[0]
+    CompactDFA.depth_of(resolution)
+    CompactDFA.depth_of(tile, "tile")
+    tile = min(tile, resolution)
+    read = image.tile if isinstance(image, BinaryImageFile) else lambda r, c, size: image[r:r + size, c:c + size]
+    grid = resolution // tile
+    roots = np.empty((grid, grid), dtype=np.int64)
+    for i in range(grid):
+        for j in range(grid):
+            roots[i, j] = table.build(read(i * tile, j * tile, tile))
+    return table.merge(roots)
+
+
+def solve_tiled(path: str, tile: int = 1024, format: str | None = None, resolution: int | None = None,
+                compact: bool = False) -> DFA | CompactDFA:
+    # the same DFA as module1.solve on the whole picture, with only one tile in memory at a time
+    table = QuadtreeTable()
+    root = build_tiled(table, BinaryImageFile(path, format, resolution), tile)
+    return table.to_compact(root) if compact else table.to_dfa(root)
@@ -1,31 +1,92 @@
-from phase0.FA_class import DFA
+import numpy as np
+from phase0.FA_class import DFA, CompactDFA, QUADRANT_BITS
 from phase0.FA_class import State
-from phase1.module1 import convert_into_bit_address
-from utils import utils
-from utils.utils import imageType
+from phase0.fa_binary import load_fa
+from phase1.module1 import solve_compact
+from utils import instrument
+from utils.image_types import imageType
 
 
 def chack_address(address: str, fa: DFA):
     curr: State = fa.init_state
+    instrument.count("phase2.transitions", len(address))
     for c in address:
         curr = curr.transitions[c]
     return fa.is_final(curr)
 
 
-def solve_percentage(fa: DFA, image: imageType) -> float:
-    address = convert_into_bit_address(image)
-    match = 0
-    for add in address:
-        if chack_address(add, fa):
-            match += 1
-    return match / len(address)
+def acceptance_raster(fa: DFA | CompactDFA, resolution: int) -> np.ndarray:
+    # walks every pixel address at once, one quadtree level per step
+    CompactDFA.depth_of(resolution)
+    fa = CompactDFA.from_dfa(fa)
+    table = fa.quadrant_table()
+    states = np.full((1, 1), fa.init_index, dtype=np.int32)
+    while states.shape[0] < resolution:
+        size = states.shape[0]
+        frontier = np.empty((2 * size, 2 * size), dtype=np.int32)
+        for quadrant, (row_bit, col_bit) in enumerate(QUADRANT_BITS):
+            frontier[row_bit::2, col_bit::2] = table[states, quadrant]
+        states = frontier
+        instrument.count("phase2.transitions", states.size)
+    return fa.final_mask[states]
 
 
-def solve(json_str: str, image: imageType) -> bool:
-    fa = DFA.deserialize_json(json_str)
-    res = solve_percentage(fa, image)
-    print(str(res * 100) + "%")
-    return res == 1
+def recognize(fa: DFA | CompactDFA, image: imageType) -> tuple[np.ndarray, float]:
+    black = np.asarray(image) == 1
+    if black.ndim != 2 or black.shape[0] != black.shape[1]:
+        raise ValueError(f"image must be square, got shape {black.shape}")
+    accepted = acceptance_raster(fa, black.shape[0])
+    total = int(np.count_nonzero(black))
+    # a picture without black pixels has nothing to reject
+    if total == 0:
+        return accepted, 1.0
+    return accepted, int(np.count_nonzero(accepted & black)) / total
+
+
+def intersection_count(fa1: DFA | CompactDFA, fa2: DFA | CompactDFA, depth: int) -> int:
+    # number of pixel addresses of length depth accepted by both machines, counted
+    # bottom-up over the state pairs of the product automaton reachable at each level
+    fa1 = CompactDFA.from_dfa(fa1)
+    fa2 = CompactDFA.from_dfa(fa2)
+    table1 = fa1.quadrant_table().astype(np.int64)
+    table2 = fa2.quadrant_table().astype(np.int64)
+    width = len(table2)
+
+    def children(pairs: np.ndarray) -> np.ndarray:
+        return table1[pairs // width] * width + table2[pairs % width]
+
+    levels = [np.array([fa1.init_index * width + fa2.init_index], dtype=np.int64)]
+    for _ in range(depth):
+        levels.append(np.unique(children(levels[-1])))
+        instrument.count("phase2.product_pairs", len(levels[-1]))
+    counts = (fa1.final_mask[levels[-1] // width] & fa2.final_mask[levels[-1] % width]).astype(np.int64)
+    for level in range(depth - 1, -1, -1):
+        counts = counts[np.searchsorted(levels[level + 1], children(levels[level]))].sum(axis=1)
+    return int(counts[0])
+
+
+def similarity(image_fa: DFA | CompactDFA, fa: DFA | CompactDFA, depth: int) -> float:
+    image_fa = CompactDFA.from_dfa(image_fa)
+    black = int(image_fa.accepted_counts(depth, ['0', '1', '2', '3'])[depth, image_fa.init_index])
+    if black == 0:
+        return 1.0
+    return intersection_count(image_fa, fa, depth) / black
+
+
+@instrument.timed("phase2.solve_percentage")
+def solve_percentage(fa: DFA | CompactDFA, image: imageType) -> float:
+    image_fa = solve_compact(image)
+    return similarity(image_fa, fa, len(image).bit_length() - 1)
+
+
+@instrument.timed("phase2.solve")
+def solve(json_str: str | bytes, image: imageType) -> bool:
+    # every black pixel of the picture is accepted: inclusion at the picture's depth
+    with instrument.timer("phase2.load"):
+        fa = CompactDFA.from_dfa(load_fa(json_str))
+    image_fa = solve_compact(image)
+    with instrument.timer("phase2.is_subset"):
+        return image_fa.is_subset(fa, len(image).bit_length() - 1)
 
 
 if __name__ == "__main__":
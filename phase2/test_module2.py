@@ -32,6 +32,30 @@ class TestModule2(unittest.TestCase):
 
         self.assertEqual(res, False)
 
+    def test_recognize(self):
+        with open(os.path.join("../data/module2Test", "json_fa.json"), 'r') as file:
+            fa = module2.DFA.deserialize_json(file.read())
+
+        accepted, ratio = module2.recognize(fa, [[0] * 16 for _ in range(16)])
+        self.assertEqual(ratio, 1.0)
+
+        for i in range(16):
+            for j in range(16):
+                address = ''.join(str((i >> b & 1) * 2 + (j >> b & 1)) for b in range(3, -1, -1))
+                self.assertEqual(bool(accepted[i][j]), module2.chack_address(address, fa))
+
+    def test_similarity(self):
+        with open(os.path.join("../data/module2Test", "json_fa.json"), 'r') as file:
+            fa = module2.DFA.deserialize_json(file.read())
+
+        for image_file in ["1.png", "2.png"]:
+            image_path = os.path.join("../data/module2Test", image_file)
+            binary_array = utils.convert_pictures_to_gray_scale_and_binary_array(image_path, 64)
+            image_fa = module2.solve_compact(binary_array)
+
+            self.assertEqual(module2.similarity(image_fa, fa, 6), module2.recognize(fa, binary_array)[1])
+            self.assertEqual(module2.similarity(image_fa, image_fa, 6), 1.0)
+
 
 if __name__ == "__main__":
     unittest.main()
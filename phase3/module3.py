@@ -1,29 +1,192 @@
-from utils.utils import imageType
-from phase0.FA_class import DFA
-from phase2.module2 import solve_percentage
+import os
+from typing import TYPE_CHECKING
+import numpy as np
+from utils import instrument
+from utils.image_types import imageType
+from phase0.FA_class import DFA, CompactDFA, TRANSFORMS
+from phase0.fa_binary import load_fa_list
+from phase1.module1 import solve_compact
+from phase2.module2 import similarity, intersection_count
 
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
 
-def get_best_fa(fa_list: list[DFA], image: imageType) -> int:
+
+def variants(image_fa: CompactDFA, invariant: bool) -> list[CompactDFA]:
+    # with invariant, the picture is compared in all 8 rotations and flips
+    if not invariant:
+        return [image_fa]
+    return [image_fa.transform(name) for name in TRANSFORMS]
+
+
+def get_best_fa(fa_list: list[DFA], image: imageType, invariant: bool = False) -> int:
+    image_fas = variants(solve_compact(image), invariant)
+    depth = len(image).bit_length() - 1
     max = -1
     j = -1
     for i in range(len(fa_list)):
         fa = fa_list[i]
-        res = solve_percentage(fa, image)
+        res = max_similarity(image_fas, fa, depth)
         if res > max:
             max = res
             j = i
     return j
 
 
-def solve(json_fa_list: list[str], images: list[imageType]) -> list[int]:
-    fa_list = list[DFA]()
-    for json_fa in json_fa_list:
-        fa_list.append(DFA.deserialize_json(json_fa))
-    res = list[int]()
+class Classification:
+    def __init__(self, scores: np.ndarray, top_k: int = 1) -> None:
+        # scores[i, j] is the similarity of image i to FA j; ties keep the lower FA index first
+        self.scores = scores
+        self.top = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+
+    @property
+    def best(self) -> list[int]:
+        if self.scores.shape[1] == 0:
+            return [-1] * self.scores.shape[0]
+        return self.top[:, 0].tolist()
+
+
+def max_similarity(image_fas: list[CompactDFA], fa: DFA | CompactDFA, depth: int) -> float:
+    return max(similarity(image_fa, fa, depth) for image_fa in image_fas)
+
+
+def score_image(fa_list: list[CompactDFA], image: np.ndarray, invariant: bool = False) -> list[float]:
+    # the image is encoded once and compared against every FA
+    image_fas = variants(solve_compact(image), invariant)
+    depth = len(image).bit_length() - 1
+    instrument.count("phase3.comparisons", len(image_fas) * len(fa_list))
+    return [max_similarity(image_fas, fa, depth) for fa in fa_list]
+
+
+_worker_fa_list: list[CompactDFA] = []
+_worker_memory: 'SharedMemory | None' = None
+_worker_invariant = False
+
+
+def _init_worker(memory_name: str, fa_list: list[CompactDFA], invariant: bool) -> None:
+    from multiprocessing.shared_memory import SharedMemory
+
+    global _worker_fa_list, _worker_memory, _worker_invariant
+    _worker_fa_list = fa_list
+    _worker_memory = SharedMemory(name=memory_name)
+    _worker_invariant = invariant
+
+
+def _score_chunk(layout: list[tuple[int, int]]) -> list[list[float]]:
+    rows = []
+    for offset, resolution in layout:
+        image = np.ndarray((resolution, resolution), dtype=np.uint8, buffer=_worker_memory.buf, offset=offset)
+        rows.append(score_image(_worker_fa_list, image, _worker_invariant))
+    return rows
+
+
+@instrument.timed("phase3.classify")
+def classify(fa_list: list[DFA | CompactDFA], images: list[imageType], top_k: int = 1,
+             workers: int | None = 1, invariant: bool = False) -> Classification:
+    # scores in this process by default; workers > 1 (None for every core) spreads the
+    # images over a process pool that reads them from shared memory
+    fa_list = [CompactDFA.from_dfa(fa) for fa in fa_list]
+    images = [(np.asarray(image) == 1).astype(np.uint8) for image in images]
+    workers = min((os.cpu_count() or 1) if workers is None else workers, len(images))
+    if workers <= 1:
+        rows = [score_image(fa_list, image, invariant) for image in images]
+        return Classification(np.array(rows, dtype=np.float64).reshape(len(images), len(fa_list)), top_k)
+
+    # the pool machinery costs more to import than a one-image classify takes, so only the
+    # parallel path loads it
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+
+    layout = []
+    offset = 0
     for image in images:
-        res.append(get_best_fa(fa_list, image))
+        layout.append((offset, image.shape[0]))
+        offset += image.size
+    memory = SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for image, (start, resolution) in zip(images, layout):
+            np.ndarray(image.shape, dtype=np.uint8, buffer=memory.buf, offset=start)[:] = image
+        chunk = -(-len(images) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(memory.name, fa_list, invariant)) as pool:
+            chunks = pool.map(_score_chunk, [layout[i:i + chunk] for i in range(0, len(layout), chunk)])
+            rows = [row for rows in chunks for row in rows]
+    finally:
+        memory.close()
+        memory.unlink()
+    return Classification(np.array(rows, dtype=np.float64).reshape(len(images), len(fa_list)), top_k)
+
+
+def quadrant_counts(fa: CompactDFA, depth: int, levels: int) -> list[np.ndarray]:
+    # accepted pixels in every quadrant of levels 1..levels, quadrants in address order
+    symbols = ['0', '1', '2', '3']
+    counts = fa.accepted_counts(depth, symbols)
+    table = fa.table[:, [fa.symbol_index[symbol] for symbol in symbols]]
+    states = np.array([fa.init_index])
+    res = []
+    for level in range(1, min(levels, depth) + 1):
+        states = table[states].ravel()
+        res.append(counts[depth - level][states])
     return res
 
 
+class FAIndex:
+    LEVELS = 3
+
+    def __init__(self, fa_list: list[DFA | CompactDFA]) -> None:
+        self.fa_list = [CompactDFA.from_dfa(fa) for fa in fa_list]
+        self.signatures: dict[int, list[np.ndarray]] = {}
+        self.evaluated = 0
+
+    def signature(self, depth: int) -> list[np.ndarray]:
+        # per level, an (FAs x quadrants) matrix of accepted pixel counts, built once per resolution
+        if depth not in self.signatures:
+            per_fa = [quadrant_counts(fa, depth, FAIndex.LEVELS) for fa in self.fa_list]
+            self.signatures[depth] = [np.array([counts[level] for counts in per_fa], dtype=np.int64)
+                                      .reshape(len(self.fa_list), 4 ** (level + 1))
+                                      for level in range(min(FAIndex.LEVELS, depth))]
+        return self.signatures[depth]
+
+    def query(self, image: imageType, invariant: bool = False) -> int:
+        # same answer as get_best_fa: FAs are visited by decreasing coarse upper bound and
+        # skipped once even their finest bound cannot beat (or tie below) the best exact count
+        self.evaluated = 0
+        if len(self.fa_list) == 0:
+            return -1
+        image_fas = variants(solve_compact(image), invariant)
+        depth = len(image).bit_length() - 1
+        if depth == 0:
+            return get_best_fa(self.fa_list, image, invariant)
+        # a bound must hold for every variant the exact score may come from
+        per_variant = [quadrant_counts(image_fa, depth, FAIndex.LEVELS) for image_fa in image_fas]
+        if per_variant[0][0].sum() == 0:
+            return 0
+        bounds = [np.max([np.minimum(matrix, counts[level]).sum(axis=1) for counts in per_variant], axis=0)
+                  for level, matrix in enumerate(self.signature(depth))]
+        best = -1
+        best_count = -1
+        for i in np.lexsort((np.arange(len(self.fa_list)), -bounds[0])).tolist():
+            if bounds[0][i] < best_count:
+                break
+            bound = int(bounds[-1][i])
+            if bound < best_count or (bound == best_count and i > best):
+                continue
+            self.evaluated += 1
+            count = max(intersection_count(image_fa, self.fa_list[i], depth) for image_fa in image_fas)
+            if count > best_count or (count == best_count and i < best):
+                best = i
+                best_count = count
+        return best
+
+    def classify(self, images: list[imageType], invariant: bool = False) -> list[int]:
+        return [self.query(image, invariant) for image in images]
+
+
+@instrument.timed("phase3.solve")
+def solve(json_fa_list: list[str | bytes] | bytes, images: list[imageType], workers: int | None = 1) -> list[int]:
+    with instrument.timer("phase3.load"):
+        fa_list = load_fa_list(json_fa_list)
+    return classify(fa_list, images, workers=workers).best
+
+
 if __name__ == "__main__":
     ...
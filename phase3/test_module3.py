@@ -1,10 +1,23 @@
 import unittest
 import os
 import module3
+from phase0 import fa_binary
 from utils import utils
 
 
 class TestModule3(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_directory = "../data/module3Test"
+        _, images = utils.load_binary_images(test_directory, 128)
+        cls.images = [image.tolist() for image in images]
+        cls.json_fa_list = []
+        for json_file in sorted(file for file in os.listdir(test_directory) if file.endswith(".json")):
+            with open(os.path.join(test_directory, json_file), 'r') as file:
+                cls.json_fa_list.append(file.read())
+        cls.fa_list = [module3.CompactDFA.deserialize_json(json_fa) for json_fa in cls.json_fa_list]
+        cls.expected = list(range(len(cls.images)))
+
     def test(self):
         test_directory = "../data/module3Test"
         image_files = [file for file in os.listdir(test_directory) if file.endswith((".jpg", ".png"))]
@@ -36,6 +49,29 @@ class TestModule3(unittest.TestCase):
         for i in range(len(res)):
             self.assertEqual(i, res[i])
 
+    def test_parallel_classify(self):
+        result = module3.classify(self.fa_list, self.images, top_k=3, workers=2)
+
+        self.assertEqual(result.scores.shape, (len(self.images), len(self.fa_list)))
+        self.assertEqual(result.top.shape, (len(self.images), 3))
+        self.assertEqual(result.best, self.expected)
+        self.assertEqual(module3.classify(self.fa_list, self.images, top_k=3).scores.tolist(), result.scores.tolist())
+        for i, image in enumerate(self.images):
+            self.assertEqual(result.scores[i].tolist(), module3.score_image(self.fa_list, image))
+
+    def test_fa_index(self):
+        index = module3.FAIndex(self.fa_list + self.fa_list[::-1])
+        self.assertEqual(index.classify(self.images), self.expected)
+
+    def test_binary_library(self):
+        self.assertEqual(module3.solve(fa_binary.json_to_binary(self.json_fa_list), self.images), self.expected)
+
+    def test_invariant(self):
+        rotated = [[list(row) for row in zip(*image[::-1])] for image in self.images]
+        self.assertEqual(module3.classify(self.fa_list, rotated, invariant=True).best, self.expected)
+        index = module3.FAIndex(self.fa_list + self.fa_list[::-1])
+        self.assertEqual(index.classify(rotated, invariant=True), self.expected)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,15 +1,18 @@
 from math import log2
-from phase0.FA_class import DFA, State
-from phase1.module1 import convert_into_bit_address, split_into_fourths
-from phase2.module2 import chack_address
-from utils.utils import imageType, imageIndexType
+import numpy as np
+from phase0.FA_class import DFA, State, CompactDFA, QUADRANT_BITS
+from phase0.fa_binary import load_fa
+from phase1.module1 import split_into_fourths
+from utils import instrument
+from utils.image_types import imageType, imageIndexType
 
 
 def create_from_bit_address(res: imageType, index: imageIndexType, bit_address: list[str]):
-    if index is None or len(index) == 0:
+    index = np.asarray(index)
+    if index.size == 0:
         return
-    if len(index) == 1 and len(index[0]) == 1:
-        res[index[0][0][0]][index[0][0][1]] = 1 if len(bit_address) > 0 else 0
+    if len(bit_address) == 0 or len(bit_address) == index.shape[0] * index.shape[1]:
+        _fill(res, index, 1 if len(bit_address) > 0 else 0)
         return
     part_address = [list[str]() for _ in range(4)]
     for addr in bit_address:
@@ -19,19 +22,68 @@ def create_from_bit_address(res: imageType, index: imageIndexType, bit_address:
         create_from_bit_address(res, parts[i], part_address[i])
 
 
-def solve(json_str: str, resolution: int) -> imageType:
-    fa = DFA.deserialize_json(json_str)
-    image = [[1 for _ in range(resolution)] for _ in range(resolution)]
-    index_image = [[(i, j) for j in range(resolution)] for i in range(resolution)]
-    bit_address = convert_into_bit_address(image)
-    true_bit_address = list[str]()
-    for addr in bit_address:
-        if chack_address(addr, fa):
-            true_bit_address.append(addr)
-    create_from_bit_address(image, index_image, true_bit_address)
+def _fill(res: imageType, index: np.ndarray, value: int) -> None:
+    if isinstance(res, np.ndarray):
+        res[index[..., 0], index[..., 1]] = value
+        return
+    for i, j in index.reshape(-1, 2).tolist():
+        res[i][j] = value
+
+
+def uniform_colors(fa: CompactDFA, depth: int) -> np.ndarray:
+    # 1 (0) for states that only reach final (non-final) states within depth steps, -1 otherwise
+    reaches_black = fa.final_mask.copy()
+    reaches_white = ~fa.final_mask
+    for _ in range(depth):
+        next_black = reaches_black | reaches_black[fa.table].any(axis=1)
+        next_white = reaches_white | reaches_white[fa.table].any(axis=1)
+        if np.array_equal(next_black, reaches_black) and np.array_equal(next_white, reaches_white):
+            break
+        reaches_black, reaches_white = next_black, next_white
+    colors = np.full(len(fa.table), -1, dtype=np.int8)
+    colors[~reaches_black] = 0
+    colors[~reaches_white] = 1
+    return colors
+
+
+@instrument.timed("phase4.render")
+def render(fa: DFA | CompactDFA, resolution: int) -> np.ndarray:
+    depth = CompactDFA.depth_of(resolution)
+    fa = CompactDFA.from_dfa(fa)
+    table = fa.quadrant_table().tolist()
+    colors = uniform_colors(fa, depth).tolist()
+    final = fa.final_mask.tolist()
+    image = np.empty((resolution, resolution), dtype=np.uint8)
+    # (state, remaining depth) -> corner of the first block rendered for it
+    rendered: dict[tuple[int, int], tuple[int, int]] = {}
+
+    def fill(state: int, level: int, row: int, col: int) -> None:
+        size = 1 << level
+        if colors[state] >= 0 or level == 0:
+            image[row:row + size, col:col + size] = colors[state] if colors[state] >= 0 else final[state]
+            return
+        corner = rendered.get((state, level))
+        if corner is not None:
+            image[row:row + size, col:col + size] = image[corner[0]:corner[0] + size, corner[1]:corner[1] + size]
+            return
+        rendered[(state, level)] = (row, col)
+        half = size // 2
+        for (row_bit, col_bit), next_state in zip(QUADRANT_BITS, table[state]):
+            fill(next_state, level - 1, row + row_bit * half, col + col_bit * half)
+
+    fill(fa.init_index, depth, 0, 0)
+    instrument.count("phase4.pixels", image.size)
+    instrument.count("phase4.blocks_rendered", len(rendered))
     return image
 
 
+@instrument.timed("phase4.solve")
+def solve(json_str: str | bytes, resolution: int) -> imageType:
+    with instrument.timer("phase4.load"):
+        fa = load_fa(json_str)
+    return render(fa, resolution).tolist()
+
+
 if __name__ == "__main__":
     pic_arr = solve(
         '{"states": ["q_0", "q_1", "q_2", "q_3", "q_4"], "initial_state": "q_0", "final_states": ["q_3"], '
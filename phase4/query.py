@@ -0,0 +1,90 @@
+from phase0.FA_class import DFA, CompactDFA, QUADRANTS, QUADRANT_BITS
+
+# rows and columns are half-open: a rectangle (top, left, bottom, right) covers
+# rows top..bottom-1 and columns left..right-1 of the picture fa draws at resolution
+
+
+class RegionQuery:
+    def __init__(self, fa: DFA | CompactDFA, resolution: int) -> None:
+        self.depth = CompactDFA.depth_of(resolution)
+        self.fa = CompactDFA.from_dfa(fa)
+        self.resolution = resolution
+        self.transitions = self.fa.quadrant_table().tolist()
+        # counts[level][state]: black pixels in a block of side 2**level drawn from state
+        self.counts = self.fa.accepted_counts(self.depth, list(QUADRANTS)).tolist()
+        self.extents: dict[tuple[str, int, int], int | None] = {}
+
+    def black_count(self) -> int:
+        return self.counts[self.depth][self.fa.init_index]
+
+    def count(self, top: int, left: int, bottom: int, right: int) -> int:
+        top, left = max(top, 0), max(left, 0)
+        bottom, right = min(bottom, self.resolution), min(right, self.resolution)
+        if top >= bottom or left >= right:
+            return 0
+        return self._count(self.fa.init_index, self.depth, 0, 0, top, left, bottom, right)
+
+    def _count(self, state: int, level: int, row: int, col: int, top: int, left: int, bottom: int,
+               right: int) -> int:
+        size = 1 << level
+        if row >= bottom or col >= right or row + size <= top or col + size <= left:
+            return 0
+        if self.counts[level][state] == 0:
+            return 0
+        if top <= row and left <= col and row + size <= bottom and col + size <= right:
+            return self.counts[level][state]
+        half = size // 2
+        return sum(self._count(next_state, level - 1, row + row_bit * half, col + col_bit * half,
+                               top, left, bottom, right)
+                   for (row_bit, col_bit), next_state in zip(QUADRANT_BITS, self.transitions[state]))
+
+    def _walk(self, address: str) -> int:
+        if len(address) > self.depth:
+            raise ValueError(f"address {address!r} is deeper than the picture")
+        state = self.fa.init_index
+        for char in address:
+            state = self.transitions[state][int(char)]
+        return state
+
+    def quadrant_count(self, address: str) -> int:
+        return self.counts[self.depth - len(address)][self._walk(address)]
+
+    def density(self, address: str = "") -> float:
+        return self.quadrant_count(address) / 4 ** (self.depth - len(address))
+
+    def pixel(self, row: int, col: int) -> int:
+        if not (0 <= row < self.resolution and 0 <= col < self.resolution):
+            raise IndexError(f"pixel ({row}, {col}) is outside a {self.resolution} picture")
+        return int(self.fa.final_mask[self._walk(CompactDFA.pixel_address(row, col, self.depth))])
+
+    def bounding_box(self) -> tuple[int, int, int, int] | None:
+        state = self.fa.init_index
+        if self.counts[self.depth][state] == 0:
+            return None
+        return (self._extent("top", state, self.depth), self._extent("left", state, self.depth),
+                self._extent("bottom", state, self.depth) + 1, self._extent("right", state, self.depth) + 1)
+
+    # side -> quadrant pairs in search order, each with its offset in half blocks along that side
+    SIDES = {"top": (((0, 1), 0), ((2, 3), 1)), "bottom": (((2, 3), 1), ((0, 1), 0)),
+             "left": (((0, 2), 0), ((1, 3), 1)), "right": (((1, 3), 1), ((0, 2), 0))}
+
+    def _extent(self, side: str, state: int, level: int) -> int | None:
+        # offset inside the block of the outermost black row or column on that side, memoized per state and level
+        if self.counts[level][state] == 0:
+            return None
+        if level == 0:
+            return 0
+        key = (side, state, level)
+        if key in self.extents:
+            return self.extents[key]
+        half = 1 << (level - 1)
+        outermost = min if side in ("top", "left") else max
+        res = None
+        for quadrants, offset in self.SIDES[side]:
+            found = [self._extent(side, self.transitions[state][quadrant], level - 1) for quadrant in quadrants]
+            found = [value for value in found if value is not None]
+            if found:
+                res = outermost(found) + offset * half
+                break
+        self.extents[key] = res
+        return res
@@ -1,6 +1,9 @@
 import unittest
 import os
 import module4
+import query
+from phase0 import fa_binary
+from phase1 import module1
 from utils import utils
 
 
@@ -27,6 +30,41 @@ class TestModule2(unittest.TestCase):
             binary_array2 = module4.solve(json_fa, 128)
 
             self.assertEqual(binary_array, binary_array2)
+            self.assertEqual(module4.solve(fa_binary.json_to_binary([json_fa]), 128), binary_array2)
+
+    def test_render(self):
+        image = [[1, 1, 1, 1],
+                 [1, 0, 1, 0],
+                 [0, 1, 0, 1],
+                 [1, 1, 1, 1]]
+        fa = module4.DFA()
+        fa.alphabet = ['0', '1', '2', '3']
+        state = fa.add_state(0)
+        fa.assign_initial_state(state)
+        fa.add_final_state(state)
+        for symbol in fa.alphabet:
+            fa.add_transition(state, state, symbol)
+
+        self.assertEqual(module4.render(fa, 8).tolist(), [[1] * 8 for _ in range(8)])
+        self.assertEqual(module4.solve(module1.solve(image).serialize_json(), 4), image)
+        self.assertEqual(module4.render(module1.solve(image), 16).tolist(),
+                         [[pixel for pixel in row for _ in range(4)] for row in image for _ in range(4)])
+
+    def test_query(self):
+        binary_array = utils.convert_pictures_to_gray_scale_and_binary_array("../data/module3Test/4.png", 128)
+        region = query.RegionQuery(module1.solve(binary_array), 128)
+
+        self.assertEqual(region.black_count(), sum(map(sum, binary_array)))
+        self.assertEqual(region.count(10, 20, 100, 77), sum(sum(row[20:77]) for row in binary_array[10:100]))
+        self.assertEqual(region.quadrant_count("21"), sum(sum(row[32:64]) for row in binary_array[64:96]))
+        self.assertEqual(region.density("3"), sum(sum(row[64:]) for row in binary_array[64:]) / 64 ** 2)
+        self.assertEqual(region.pixel(37, 101), binary_array[37][101])
+        for row, col in [(-1, 0), (0, -1), (128, 0), (0, 128)]:
+            self.assertRaises(IndexError, region.pixel, row, col)
+
+        rows = [i for i, row in enumerate(binary_array) if any(row)]
+        cols = [j for j in range(128) if any(row[j] for row in binary_array)]
+        self.assertEqual(region.bounding_box(), (rows[0], cols[0], rows[-1] + 1, cols[-1] + 1))
 
 
 if __name__ == "__main__":
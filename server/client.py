@@ -0,0 +1,54 @@
+import itertools
+import json
+import socket
+import numpy as np
+from server.worker import decode_image, encode_image
+
+
+class Client:
+    # a blocking client for one worker socket; requests are answered in order on this connection
+    def __init__(self, socket_path: str, timeout: float | None = None) -> None:
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile('rwb')
+        self.ids = itertools.count()
+
+    def request(self, op: str, **fields) -> dict:
+        request_id = next(self.ids)
+        self.file.write((json.dumps({"op": op, "id": request_id, **fields}) + "\n").encode())
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if response.get("id") != request_id:
+            raise RuntimeError(f"response {response.get('id')} does not answer request {request_id}")
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def encode(self, image: np.ndarray) -> str:
+        return self.request("encode", **encode_image(image))["fa"]
+
+    def recognize(self, image: np.ndarray, fa: int | str) -> dict:
+        return self.request("recognize", fa=fa, **encode_image(image))
+
+    def classify(self, image: np.ndarray, top_k: int = 1) -> dict:
+        return self.request("classify", top_k=top_k, **encode_image(image))
+
+    def render(self, fa: int | str, resolution: int) -> np.ndarray:
+        return decode_image(self.request("render", fa=fa, resolution=resolution, packed=True))
+
+    def reload(self, path: str | None = None) -> dict:
+        return self.request("reload", **({} if path is None else {"path": path}))
+
+    def stats(self) -> dict:
+        return self.request("stats")
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self) -> 'Client':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
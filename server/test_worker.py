@@ -0,0 +1,110 @@
+import unittest
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import worker
+from client import Client
+from phase0 import fa_binary
+from phase1 import module1
+from utils import utils
+
+
+class TestWorker(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.library = os.path.join(self.directory, "library")
+        shutil.copytree("../data/module3Test", self.library, ignore=shutil.ignore_patterns("*.jpg", "*.png"))
+        _, self.images = utils.load_binary_images("../data/module3Test", 128)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test(self):
+        socket_path = os.path.join(self.directory, "worker.sock")
+        with worker.ServerThread(socket_path, self.library, batch_window=0.02) as server:
+            with Client(socket_path) as client:
+                for i, image in enumerate(self.images):
+                    self.assertEqual(client.classify(image)["best"], i)
+                result = client.classify(self.images[2], top_k=3)
+                self.assertEqual(result["top"][0], 2)
+                self.assertEqual(len(result["scores"]), 5)
+
+                fa = client.encode(self.images[0])
+                self.assertTrue((client.render(fa, 128) == self.images[0]).all())
+                self.assertTrue(client.recognize(self.images[0], fa)["accepted"])
+                self.assertEqual(client.recognize(self.images[0], fa)["similarity"], 1.0)
+                self.assertEqual(client.render(3, 64).shape, (64, 64))
+                with self.assertRaises(RuntimeError):
+                    client.render(3, 63)
+
+            # concurrent clients are coalesced into batches
+            results = {}
+
+            def classify(i: int) -> None:
+                with Client(socket_path) as client:
+                    results[i] = client.classify(self.images[i % 5])["best"]
+
+            before = server.worker.stats()
+            threads = [threading.Thread(target=classify, args=(i,)) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, {i: i % 5 for i in range(10)})
+            stats = server.worker.stats()
+            self.assertEqual(stats["requests"] - before["requests"], 10)
+            self.assertLess(stats["batches"] - before["batches"], 10)
+
+            # hot reload: the library becomes a single-FA binary file
+            binary = os.path.join(self.directory, "library.bin")
+            fa_binary.dump([module1.solve_compact(self.images[4])], binary)
+            with Client(socket_path) as client:
+                self.assertEqual(client.reload(binary), {"size": 1, "generation": 1, "id": 0})
+                self.assertEqual(client.classify(self.images[4])["best"], 0)
+
+    def test_process_pool(self):
+        socket_path = os.path.join(self.directory, "worker.sock")
+        with worker.ServerThread(socket_path, self.library, workers=2, batch_window=0.02) as server:
+            results = {}
+
+            def classify(i: int) -> None:
+                with Client(socket_path) as client:
+                    results[i] = client.classify(self.images[i % 5])["best"]
+
+            threads = [threading.Thread(target=classify, args=(i,)) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, {i: i % 5 for i in range(10)})
+
+            with Client(socket_path) as client:
+                fa = client.encode(self.images[1])
+                self.assertTrue((client.render(fa, 128) == self.images[1]).all())
+
+                # reload replaces the pool, whose processes load the new library themselves
+                binary = os.path.join(self.directory, "library.bin")
+                fa_binary.dump([module1.solve_compact(self.images[3])], binary)
+                reloaded = client.reload(binary)
+                self.assertEqual((reloaded["size"], reloaded["generation"]), (1, 1))
+                self.assertEqual(client.classify(self.images[3])["best"], 0)
+                self.assertEqual(client.render(0, 128).sum(), self.images[3].sum())
+            self.assertEqual(server.worker.stats()["workers"], 2)
+
+    def test_stdio(self):
+        requests = [{"op": "classify", "id": i, **worker.encode_image(image)} for i, image in enumerate(self.images)]
+        requests.append({"op": "unknown", "id": "bad"})
+        process = subprocess.run([sys.executable, "-m", "server.worker", self.library],
+                                 input="".join(json.dumps(request) + "\n" for request in requests),
+                                 capture_output=True, text=True, cwd="..", timeout=60)
+        responses = {response["id"]: response for response in map(json.loads, process.stdout.splitlines())}
+        self.assertEqual([responses[i]["best"] for i in range(5)], list(range(5)))
+        self.assertIn("error", responses["bad"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from phase0.FA_class import CompactDFA
+from phase0.fa_binary import is_binary, load, load_fa
+from phase1.module1 import solve_compact
+from phase2.module2 import similarity
+from phase3.module3 import FAIndex, classify
+from phase4.module4 import render
+from utils.utils import load_binary_image
+
+# JSON-lines protocol: every request is one object with an "op" and an optional "id" that is
+# echoed back. Pictures travel as "image" (nested 0/1 lists), as "packed" (base64 of the
+# np.packbits rows) plus "resolution", or as a "path" to an image file plus "resolution".
+#   encode     picture                                -> {"fa": json}
+#   recognize  picture, "fa" (library index or json)  -> {"accepted": bool, "similarity": float}
+#   classify   picture, optional "top_k"              -> {"best": i} (+ "top", "scores" for top_k > 1)
+#   render     "fa", "resolution", optional "packed"  -> {"image": lists} or {"packed": ..., "resolution": n}
+#   reload     optional "path"                        -> {"size": n, "generation": g}
+#   stats, ping
+BATCHED = ("encode", "recognize", "classify", "render")
+LINE_LIMIT = 1 << 26
+
+
+def encode_image(image: np.ndarray) -> dict:
+    image = np.asarray(image, dtype=np.uint8)
+    packed = base64.b64encode(np.packbits(image, axis=1).tobytes()).decode()
+    return {"packed": packed, "resolution": image.shape[0]}
+
+
+def decode_image(request: dict) -> np.ndarray:
+    if "packed" in request:
+        resolution = request["resolution"]
+        packed = np.frombuffer(base64.b64decode(request["packed"]), dtype=np.uint8)
+        return np.unpackbits(packed.reshape(resolution, -1), axis=1, count=resolution)
+    if "path" in request:
+        return load_binary_image(request["path"], request.get("resolution", 512))
+    if "image" in request:
+        return (np.asarray(request["image"]) == 1).astype(np.uint8)
+    raise ValueError("request has no image, packed or path field")
+
+
+class Library:
+    # the FAs a worker serves, with the phase3 index built once per load
+    def __init__(self, fa_list: list[CompactDFA], path: str | None = None, names: list[str] | None = None,
+                 resolutions: list[int | None] | None = None) -> None:
+        self.fa_list = fa_list
+        self.path = path
+        self.names = names if names is not None else [str(i) for i in range(len(fa_list))]
+        # the resolution each FA was encoded at, where the library records it
+        self.resolutions = resolutions if resolutions is not None else [None] * len(fa_list)
+        self.index = FAIndex(fa_list)
+
+    @staticmethod
+    def load(path: str) -> 'Library':
+        # a binary container (with the names and resolutions of a "<path>.meta.json" next to
+        # it), a JSON-lines file (raw FAs, or records with "fa", "path" and "resolution" as
+        # written by cli.py encode), a directory of .json files or a single JSON FA
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*.json")))
+            return Library([CompactDFA.load_json(file) for file in files], path,
+                           [os.path.basename(file) for file in files])
+        with open(path, 'rb') as file:
+            head = file.read(8)
+        if is_binary(head):
+            meta = {}
+            if os.path.exists(path + ".meta.json"):
+                with open(path + ".meta.json", 'r') as file:
+                    meta = json.load(file)
+            return Library(load(path), path, meta.get("names"), meta.get("resolutions"))
+        with open(path, 'r') as file:
+            lines = [line for line in file if line.strip()]
+        if not path.endswith(".jsonl"):
+            return Library([CompactDFA.deserialize_json("".join(lines))], path, [os.path.basename(path)])
+        fa_list, names, resolutions = [], [], []
+        for line in lines:
+            record = json.loads(line)
+            if "fa" in record:
+                fa_list.append(CompactDFA.deserialize_json(record["fa"]))
+                names.append(record.get("path", str(len(names))))
+                resolutions.append(record.get("resolution"))
+            else:
+                fa_list.append(CompactDFA.from_json_items(record.items()))
+                names.append(str(len(names)))
+                resolutions.append(None)
+        return Library(fa_list, path, names, resolutions)
+
+    @staticmethod
+    def mtime(path: str) -> float:
+        if os.path.isdir(path):
+            return max([os.path.getmtime(path)] + [os.path.getmtime(file)
+                                                   for file in glob.glob(os.path.join(path, "*.json"))])
+        return os.path.getmtime(path)
+
+    def fa(self, request: dict) -> CompactDFA:
+        fa = request["fa"]
+        if isinstance(fa, int):
+            return self.fa_list[fa]
+        return CompactDFA.from_dfa(load_fa(fa))
+
+
+def _classify(library: Library, requests: list[dict]) -> list[dict]:
+    images = [decode_image(request) for request in requests]
+    top_k = max(request.get("top_k", 1) for request in requests)
+    if top_k == 1:
+        # branch and bound over the index: only the best FA is needed
+        return [{"best": best} for best in library.index.classify(images)]
+    result = classify(library.fa_list, images, top_k, workers=1)
+    return [{"best": int(top[0]) if len(top) else -1,
+             "top": top[:request.get("top_k", 1)].tolist(),
+             "scores": scores.tolist()}
+            for request, top, scores in zip(requests, result.top, result.scores)]
+
+
+def _recognize(library: Library, request: dict) -> dict:
+    image = decode_image(request)
+    fa = library.fa(request)
+    image_fa = solve_compact(image)
+    depth = image.shape[0].bit_length() - 1
+    return {"accepted": image_fa.is_subset(fa, depth), "similarity": similarity(image_fa, fa, depth)}
+
+
+def _render(library: Library, request: dict) -> dict:
+    image = render(library.fa(request), request["resolution"])
+    return encode_image(image) if request.get("packed") else {"image": image.tolist()}
+
+
+def process_batch(library: Library, op: str, requests: list[dict]) -> list[dict]:
+    # one batch of requests of the same op; a failing request only fails itself
+    if op == "classify":
+        try:
+            return _classify(library, requests)
+        except Exception as error:
+            if len(requests) == 1:
+                return [{"error": f"{type(error).__name__}: {error}"}]
+            return [process_batch(library, op, [request])[0] for request in requests]
+    res = []
+    for request in requests:
+        try:
+            if op == "encode":
+                res.append({"fa": solve_compact(decode_image(request)).serialize_json()})
+            elif op == "recognize":
+                res.append(_recognize(library, request))
+            else:
+                res.append(_render(library, request))
+        except Exception as error:
+            res.append({"error": f"{type(error).__name__}: {error}"})
+    return res
+
+
+_process_library: Library | None = None
+
+
+def _init_process(path: str | None, fa_list: list[CompactDFA] | None) -> None:
+    global _process_library
+    _process_library = Library.load(path) if path is not None else Library(fa_list)
+
+
+def _process_batch(op: str, requests: list[dict]) -> list[dict]:
+    return process_batch(_process_library, op, requests)
+
+
+class Worker:
+    # coalesces requests per op for up to `batch_window` seconds (or `max_batch` requests) and
+    # runs each batch on the CPU executor: a process pool, or one thread when workers is 0
+    def __init__(self, library: Library | str, workers: int = 0, batch_window: float = 0.002,
+                 max_batch: int = 32) -> None:
+        self.library = Library.load(library) if isinstance(library, str) else library
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.generation = 0
+        self.executor = self._executor()
+        self.pending: dict[str, list[tuple[dict, asyncio.Future]]] = {op: [] for op in BATCHED}
+        self.timers: dict[str, asyncio.TimerHandle] = {}
+        self.requests = 0
+        self.batches = 0
+
+    def _executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(1)
+        if self.library.path is not None:
+            initargs = (self.library.path, None)
+        else:
+            initargs = (None, self.library.fa_list)
+        return ProcessPoolExecutor(self.workers, initializer=_init_process, initargs=initargs)
+
+    async def _run(self, op: str, requests: list[dict]) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        if self.workers <= 0:
+            return await loop.run_in_executor(self.executor, process_batch, self.library, op, requests)
+        # one chunk per process, so a batch keeps the whole pool busy
+        size = -(-len(requests) // self.workers)
+        chunks = await asyncio.gather(*(loop.run_in_executor(self.executor, _process_batch, op, requests[i:i + size])
+                                        for i in range(0, len(requests), size)))
+        return [result for chunk in chunks for result in chunk]
+
+    async def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        try:
+            if op in BATCHED:
+                result = await self._submit(op, request)
+            elif op == "reload":
+                result = await self.reload(request.get("path"))
+            elif op == "stats":
+                result = self.stats()
+            elif op == "ping":
+                result = {}
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except Exception as error:
+            result = {"error": f"{type(error).__name__}: {error}"}
+        if "id" in request:
+            result["id"] = request["id"]
+        return result
+
+    def _submit(self, op: str, request: dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[op].append((request, future))
+        self.requests += 1
+        if len(self.pending[op]) >= self.max_batch:
+            self._flush(op)
+        elif op not in self.timers:
+            self.timers[op] = loop.call_later(self.batch_window, self._flush, op)
+        return future
+
+    def _flush(self, op: str) -> None:
+        timer = self.timers.pop(op, None)
+        if timer is not None:
+            timer.cancel()
+        batch, self.pending[op] = self.pending[op], []
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._complete(op, batch))
+
+    async def _complete(self, op: str, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        try:
+            results = await self._run(op, [request for request, _ in batch])
+        except Exception as error:
+            results = [{"error": f"{type(error).__name__}: {error}"}] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(dict(result))
+
+    async def reload(self, path: str | None = None) -> dict:
+        # the new library and executor replace the old ones; batches already running finish on the old pool
+        path = path or self.library.path
+        if path is None:
+            raise ValueError("the library was not loaded from a path")
+        loop = asyncio.get_running_loop()
+        self.library = await loop.run_in_executor(None, Library.load, path)
+        old_executor, self.executor = self.executor, self._executor()
+        old_executor.shutdown(wait=False)
+        self.generation += 1
+        return {"size": len(self.library.fa_list), "generation": self.generation}
+
+    async def watch(self, interval: float) -> None:
+        mtime = Library.mtime(self.library.path)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = Library.mtime(self.library.path)
+            except OSError:
+                continue
+            if current != mtime:
+                mtime = current
+                await self.reload()
+
+    def stats(self) -> dict:
+        return {"size": len(self.library.fa_list), "generation": self.generation, "requests": self.requests,
+                "batches": self.batches, "workers": self.workers}
+
+    async def serve_lines(self, reader: asyncio.StreamReader, write) -> None:
+        # requests on one stream run concurrently; responses are written as they complete
+        tasks = set()
+
+        async def answer(line: bytes) -> None:
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {"error": f"invalid JSON: {error}"}
+            else:
+                response = await self.handle(request)
+            write((json.dumps(response) + "\n").encode())
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.ensure_future(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                await self.serve_lines(reader, writer.write)
+                await writer.drain()
+            except (asyncio.CancelledError, ConnectionError):
+                # the server is shutting down or the client went away
+                pass
+            finally:
+                writer.close()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        return await asyncio.start_unix_server(connection, path, limit=LINE_LIMIT)
+
+    async def serve_stdio(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=LINE_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        stdout = sys.stdout.buffer
+
+        def write(data: bytes) -> None:
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve_lines(reader, write)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+class ServerThread:
+    # a worker serving a Unix socket from its own event loop thread, for embedding and tests
+    def __init__(self, socket_path: str, library: Library | str, **options) -> None:
+        self.socket_path = socket_path
+        self.loop = asyncio.new_event_loop()
+        self.worker: Worker | None = None
+        ready = threading.Event()
+        errors = []
+
+        def run() -> None:
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.worker = Worker(library, **options)
+                self.server = self.loop.run_until_complete(self.worker.serve_unix(socket_path))
+            except Exception as error:
+                errors.append(error)
+                return
+            finally:
+                ready.set()
+            self.loop.run_forever()
+            self.server.close()
+            # connections still open are cancelled before the loop goes away
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.worker.close()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def __enter__(self) -> 'ServerThread':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    worker = Worker(args.library, args.workers, args.batch_window / 1000, args.max_batch)
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(worker.reload()))
+    if args.watch:
+        asyncio.ensure_future(worker.watch(args.watch))
+    try:
+        if args.socket:
+            server = await worker.serve_unix(args.socket)
+            async with server:
+                await server.serve_forever()
+        else:
+            await worker.serve_stdio()
+    finally:
+        worker.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="serve encode/recognize/classify/render requests")
+    parser.add_argument("library", help="binary FA file, .jsonl file, directory of .json FAs or one JSON FA")
+    parser.add_argument("--socket", help="Unix socket path; JSON lines on stdin/stdout without it")
+    parser.add_argument("--workers", type=int, default=0, help="processes for CPU work, 0 runs in this process")
+    parser.add_argument("--batch-window", type=float, default=2.0, help="milliseconds to coalesce requests")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--watch", type=float, default=0, help="seconds between library change checks")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"worker stopped after {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
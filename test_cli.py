@@ -0,0 +1,94 @@
+import unittest
+import contextlib
+import io
+import json
+import os
+import tempfile
+import cv2
+import cli
+from phase0 import fa_binary
+from server.worker import Library
+from utils import utils
+
+
+class TestCli(unittest.TestCase):
+    def test(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.jsonl")
+            with contextlib.redirect_stderr(io.StringIO()):
+                cli.main(["encode", "data/module3Test", library, "--resolution", "128", "--workers", "0"])
+                with open(library, 'r') as file:
+                    lines = file.readlines()
+                self.assertEqual([json.loads(line)["path"] for line in lines],
+                                 ["1.jpg", "2.jpg", "3.png", "4.png", "5.jpg"])
+
+                # a crash in the middle of the third record: resume keeps two and encodes the rest
+                with open(library, 'w') as file:
+                    file.write("".join(lines[:2]) + lines[2][:40])
+                cli.main(["encode", "data/module3Test", library, "--resolution", "128", "--workers", "0", "--resume"])
+                with open(library, 'r') as file:
+                    self.assertEqual(sorted(file.readlines()), sorted(lines))
+
+                binary = os.path.join(directory, "library.bin")
+                cli.main(["encode", "data/module3Test/*.png", binary, "--resolution", "128", "--workers", "0"])
+                self.assertEqual(len(fa_binary.load(binary)), 2)
+
+                output = os.path.join(directory, "classify.jsonl")
+                cli.main(["classify", library, "data/module3Test", "--resolution", "128", "--names",
+                          "--output", output, "--workers", "0"])
+            with open(output, 'r') as file:
+                results = [json.loads(line) for line in file]
+            self.assertEqual([result["name"] for result in results], ["1.jpg", "2.jpg", "3.png", "4.png", "5.jpg"])
+
+
+    def test_encode_order(self):
+        # worker processes finish in any order, the library keeps the input order
+        names = ["1.jpg", "2.jpg", "3.png", "4.png", "5.jpg"]
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.jsonl")
+            binary = os.path.join(directory, "library.bin")
+            with contextlib.redirect_stderr(io.StringIO()):
+                cli.main(["encode", "data/module3Test", library, "--resolution", "64", "--workers", "2"])
+                cli.main(["encode", "data/module3Test", binary, "--resolution", "64", "--workers", "2"])
+            with open(library, 'r') as file:
+                self.assertEqual([json.loads(line)["path"] for line in file], names)
+            loaded = Library.load(binary)
+            self.assertEqual(loaded.names, names)
+            self.assertEqual(loaded.resolutions, [64] * 5)
+            self.assertEqual([fa.canonical_hash() for fa in loaded.fa_list],
+                             [fa.canonical_hash() for fa in Library.load(library).fa_list])
+
+
+    def test_classify_recognize_render(self):
+        names = ["1.jpg", "2.jpg", "3.png", "4.png", "5.jpg"]
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library.jsonl")
+            classified = os.path.join(directory, "classify.jsonl")
+            recognized = os.path.join(directory, "recognize.jsonl")
+            pictures = os.path.join(directory, "pictures")
+            with contextlib.redirect_stderr(io.StringIO()):
+                cli.main(["encode", "data/module3Test", library, "--resolution", "64", "--workers", "0"])
+                # the images are probed at the resolution the library was encoded at
+                cli.main(["classify", library, "data/module3Test", "--output", classified, "--workers", "0"])
+                with self.assertRaises(SystemExit):
+                    cli.main(["classify", library, "data/module3Test", "--resolution", "128", "--workers", "0"])
+                cli.main(["recognize", library, "data/module3Test", "--index", "2", "--output", recognized,
+                          "--workers", "0"])
+                cli.main(["render", library, pictures, "--workers", "0"])
+            with open(classified, 'r') as file:
+                self.assertEqual({result["path"]: result["best"] for result in map(json.loads, file)},
+                                 {os.path.join("data/module3Test", name): i for i, name in enumerate(names)})
+            with open(recognized, 'r') as file:
+                results = {os.path.basename(result["path"]): result for result in map(json.loads, file)}
+            self.assertTrue(results["3.png"]["accepted"])
+            self.assertEqual(results["3.png"]["similarity"], 1.0)
+            self.assertLess(results["1.jpg"]["similarity"], 1.0)
+            self.assertEqual(sorted(os.listdir(pictures)), ["1.png", "2.png", "3.png", "4.png", "5.png"])
+            for name in names:
+                drawn = cv2.imread(os.path.join(pictures, os.path.splitext(name)[0] + ".png"), cv2.IMREAD_GRAYSCALE)
+                encoded = utils.load_binary_image(os.path.join("data/module3Test", name), 64)
+                self.assertTrue(((drawn // 255) == encoded).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
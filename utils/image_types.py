@@ -0,0 +1,4 @@
+# The picture types shared by every phase. They live apart from utils.utils so the
+# automaton code can use them without loading OpenCV.
+imageType = list[list[int]]
+imageIndexType = list[list[tuple[int, int]]]
@@ -0,0 +1,183 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import TypeVar
+
+# Opt-in timers and counters for the solve paths. Everything checks the module-level
+# `active` flag first, so instrumented code pays one global lookup when it is off.
+#   TLA_INSTRUMENT=1                 record timers and counters
+#   TLA_INSTRUMENT_MEMORY=1          also trace the peak Python allocation (tracemalloc)
+#   TLA_INSTRUMENT_REPORT=path.json  write the report when the process exits
+#   TLA_PROFILE=path.prof            cProfile the whole process, readable with pstats / snakeviz
+
+F = TypeVar('F', bound=Callable)
+
+active = False
+timers: dict[str, list[float]] = {}
+counters: dict[str, int] = {}
+_memory = False
+# the highest peak seen before the last tracemalloc.reset_peak that should not have erased it
+_peak = 0
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        entry = timers.setdefault(self.name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += time.perf_counter() - self.start
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str) -> _Timer | _NullTimer:
+    return _Timer(name) if active else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[F], F]:
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not active:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, amount: int = 1) -> None:
+    if active:
+        counters[name] = counters.get(name, 0) + int(amount)
+
+
+def reset() -> None:
+    global _peak
+    timers.clear()
+    counters.clear()
+    _peak = 0
+    if _memory:
+        tracemalloc.reset_peak()
+
+
+def report() -> dict:
+    res = {
+        "timers": {name: {"calls": int(calls), "seconds": seconds}
+                   for name, (calls, seconds) in sorted(timers.items())},
+        "counters": dict(sorted(counters.items())),
+    }
+    if _memory:
+        res["peak_memory_bytes"] = max(_peak, tracemalloc.get_traced_memory()[1])
+    return res
+
+
+def dump(path: str) -> None:
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=1)
+
+
+def _start(memory: bool) -> bool:
+    # returns whether this call started tracemalloc, so only that caller stops it
+    global active, _memory
+    active = True
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _memory = True
+        return True
+    return False
+
+
+@contextmanager
+def instrumented(memory: bool = False, profile: str | None = None) -> Iterator[dict]:
+    # with instrumented() as result: ... -- result is filled with the report of the block
+    # alone when it ends; a profile path receives a cProfile dump of the block, or a
+    # RuntimeWarning when another profiler (TLA_PROFILE) runs or the file cannot be written.
+    # Timers and counters recorded outside the block are put back afterwards, with the
+    # block's added to them.
+    global active, _memory, _peak
+    was_active = active
+    outer_timers = {name: list(entry) for name, entry in timers.items()}
+    outer_counters = dict(counters)
+    outer_peak = max(_peak, tracemalloc.get_traced_memory()[1]) if _memory else 0
+    reset()
+    started_memory = _start(memory)
+    profiler = None
+    if profile and sys.getprofile() is not None:
+        warnings.warn(f"a profiler is already running, {profile} is not written", RuntimeWarning, stacklevel=3)
+    elif profile:
+        profiler = cProfile.Profile()
+    result = {}
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            try:
+                profiler.dump_stats(profile)
+            except OSError as error:
+                # an exception from the block itself must not be replaced by this one
+                warnings.warn(f"cannot write the profile {profile}: {error}", RuntimeWarning, stacklevel=3)
+        result.update(report())
+        for name, (calls, seconds) in timers.items():
+            entry = outer_timers.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        for name, amount in counters.items():
+            outer_counters[name] = outer_counters.get(name, 0) + amount
+        timers.clear()
+        timers.update(outer_timers)
+        counters.clear()
+        counters.update(outer_counters)
+        _peak = max(outer_peak, result.get("peak_memory_bytes", 0)) if not started_memory else 0
+        active = was_active
+        if started_memory:
+            _memory = False
+            tracemalloc.stop()
+
+
+def _from_environment() -> None:
+    if os.environ.get("TLA_INSTRUMENT") or os.environ.get("TLA_INSTRUMENT_REPORT"):
+        _start(bool(os.environ.get("TLA_INSTRUMENT_MEMORY")))
+        path = os.environ.get("TLA_INSTRUMENT_REPORT")
+        if path:
+            atexit.register(dump, path)
+    profile = os.environ.get("TLA_PROFILE")
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop() -> None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        atexit.register(stop)
+
+
+_from_environment()
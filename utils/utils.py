@@ -1,16 +1,29 @@
-import cv2
+import glob
+import hashlib
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from utils.image_types import imageType, imageIndexType
 
+# cv2 is imported inside the functions that read, filter or write pictures, so code that
+# only needs the image types or the path helpers never pays for loading OpenCV
 
-imageType = list[list[int]]
-imageIndexType = list[list[tuple[int, int]]]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+THRESHOLD = 47
 
 
 def convert_pictures_to_gray_scale_and_binary_array(path: str, res: int = 512) -> list[list[int]]:
-    # Load the grayscale image array
-    gray_image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    return load_binary_image(path, res).tolist()
+
+
+def binarize(gray_image: np.ndarray, res: int = 512, threshold: int = THRESHOLD) -> np.ndarray:
+    import cv2
+
     gray_image = cv2.resize(gray_image, (res, res))
-    # Apply the Sobel operator to detect edges
+    # Apply the Sobel operator to detect edges; float64 keeps the normalisation, and so
+    # the thresholded pixels, identical to the original pipeline
     sobel_x = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
     sobel_y = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
     # Compute the gradient magnitude
@@ -18,12 +31,87 @@ def convert_pictures_to_gray_scale_and_binary_array(path: str, res: int = 512) -
     # Normalize the gradient magnitude for display
     gradient_magnitude_normalized = cv2.normalize(gradient_magnitude, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
     # threshold which convert edges to zero and one
-    threshold = 47
-    binary_array = np.where(gradient_magnitude_normalized <= threshold, 1, 0)
-    return binary_array.tolist()
+    return (gradient_magnitude_normalized <= threshold).astype(np.uint8)
+
+
+def _cache_path(cache_dir: str, path: str, res: int, threshold: int) -> str:
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{res}|{threshold}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".npy")
+
+
+def load_binary_image(path: str, res: int = 512, threshold: int = THRESHOLD,
+                      cache_dir: str | None = None) -> np.ndarray:
+    # a (res, res) uint8 array of 0/1; with a cache directory the result is stored packed
+    # and reused until the file changes
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = _cache_path(cache_dir, path, res, threshold)
+        if os.path.exists(cache_path):
+            return np.unpackbits(np.load(cache_path), axis=1, count=res)
+    import cv2
+
+    gray_image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray_image is None:
+        raise ValueError(f"cannot read image {path}")
+    binary_array = binarize(gray_image, res, threshold)
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, np.packbits(binary_array, axis=1))
+        os.replace(temp_path, cache_path)
+    return binary_array
+
+
+def image_paths(source: str | Iterable[str]) -> list[str]:
+    # a directory, a glob pattern, a single file or a list of paths
+    if not isinstance(source, str):
+        return list(source)
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, file) for file in os.listdir(source)
+                      if file.lower().endswith(IMAGE_EXTENSIONS))
+    if os.path.isfile(source):
+        return [source]
+    return sorted(glob.glob(source))
+
+
+def iter_binary_images(source: str | Iterable[str], res: int = 512, threshold: int = THRESHOLD,
+                       packed: bool = False, workers: int | None = None,
+                       cache_dir: str | None = None) -> Iterator[tuple[str, np.ndarray]]:
+    # yields (path, pixels) in path order; cv2 releases the GIL, so threads decode in parallel.
+    # At most two pictures per thread are decoded ahead of the consumer
+    paths = image_paths(source)
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(load_binary_image, path, res, threshold, cache_dir)))
+            if len(pending) >= 2 * workers:
+                path, future = pending.popleft()
+                binary_array = future.result()
+                yield path, np.packbits(binary_array, axis=1) if packed else binary_array
+        while pending:
+            path, future = pending.popleft()
+            binary_array = future.result()
+            yield path, np.packbits(binary_array, axis=1) if packed else binary_array
+
+
+def load_binary_images(source: str | Iterable[str], res: int = 512, threshold: int = THRESHOLD,
+                       packed: bool = False, workers: int | None = None,
+                       cache_dir: str | None = None) -> tuple[list[str], np.ndarray]:
+    # the paths and one (images, res, res) uint8 stack, or (images, res, res / 8) when packed
+    paths, arrays = [], []
+    for path, binary_array in iter_binary_images(source, res, threshold, packed, workers, cache_dir):
+        paths.append(path)
+        arrays.append(binary_array)
+    width = -(-res // 8) if packed else res
+    return paths, np.stack(arrays) if arrays else np.zeros((0, res, width), dtype=np.uint8)
 
 
 def save_image(pic_array: imageType) -> None:
+    import cv2
+
     p_arr = np.array(pic_array)
     im = (p_arr * 255).astype(np.uint8)
     cv2.imwrite('temp.png', im)
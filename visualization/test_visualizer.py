@@ -0,0 +1,78 @@
+import unittest
+import io
+import os
+import tempfile
+from xml.etree import ElementTree
+import numpy as np
+import visualizer
+from phase1 import module1
+
+
+class TestVisualizer(unittest.TestCase):
+    def test(self):
+        with open("../data/module2Test/json_fa.json", 'r') as file:
+            json_fa = file.read()
+
+        dot = io.StringIO()
+        visualizer.render(json_fa, dot, "dot")
+        dot = dot.getvalue()
+        self.assertTrue(dot.startswith("digraph FA {"))
+        self.assertIn('__start -> "q_0"', dot)
+        # the black and white sinks are folded into the labels of their sources
+        self.assertNotIn('"q_5" [', dot)
+        self.assertIn('\\n0,2→■', dot)
+
+        layout = visualizer.Layout(json_fa, max_depth=1)
+        self.assertEqual(sorted(layout.levels), [0, 1])
+        layout = visualizer.Layout(json_fa, around="q_3", radius=1)
+        self.assertEqual([layout.names[row] for rows in layout.levels.values() for row in rows],
+                         ["q_0", "q_3", "q_10", "q_11"])
+        self.assertEqual(layout.edges[(layout.names.index("q_3"), layout.names.index("q_11"))], ["3"])
+
+        # a neighbourhood without the initial state has no start arrow
+        layout = visualizer.Layout(json_fa, around="q_11", radius=0)
+        self.assertNotIn(layout.fa.init_index, layout.visible)
+        dot = io.StringIO()
+        visualizer.render(json_fa, dot, "dot", around="q_11", radius=0)
+        self.assertNotIn("__start", dot.getvalue())
+        self.assertIn('"q_11" [', dot.getvalue())
+        svg = io.StringIO()
+        visualizer.render(json_fa, svg, "svg", around="q_11", radius=0)
+        root = ElementTree.fromstring(svg.getvalue())
+        self.assertEqual(len(root.findall("{http://www.w3.org/2000/svg}line")), 0)
+        self.assertEqual(len(root.findall("{http://www.w3.org/2000/svg}circle")), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fa.svg")
+            visualizer.visualize(json_fa, path)
+            with open(path, 'r', encoding='utf-8') as file:
+                self.assertTrue(file.read().startswith("<svg"))
+
+    def test_large(self):
+        # the timing of this case is tracked by benchmarks/bench_visualizer.py
+        image = (np.random.default_rng(0).random((512, 512)) < 0.5).astype(np.uint8)
+        fa = module1.solve_compact(image)
+        self.assertGreater(len(fa.table), 10000)
+
+        layout = visualizer.Layout(fa)
+        rows = [row for rows in layout.levels.values() for row in rows]
+        self.assertEqual(len(rows), len(fa.table) - len(layout.sinks))
+        self.assertEqual(sorted(layout.levels), list(range(len(layout.levels))))
+        # every transition of a drawn state is either an edge label or folded into a sink
+        drawn = sum(len(symbols) for symbols in layout.edges.values())
+        folded = sum(len(symbols) for sinks in layout.folded.values() for symbols in sinks.values())
+        self.assertEqual(drawn + folded, len(rows) * len(fa.alphabet))
+
+        svg = io.StringIO()
+        visualizer.render(fa, svg, "svg")
+        root = ElementTree.fromstring(svg.getvalue())
+        namespace = "{http://www.w3.org/2000/svg}"
+        self.assertEqual(root.tag, namespace + "svg")
+        connectors = len(root.findall(namespace + "line")) + len(root.findall(namespace + "path"))
+        # one connector per merged edge, plus the arrow into the initial state
+        self.assertEqual(connectors, len(layout.edges) + 1)
+        self.assertGreaterEqual(len(root.findall(namespace + "circle")), len(rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,39 +1,224 @@
 import json
-import matplotlib.pyplot as plt
-import networkx as nx
+import os
+from collections.abc import Iterator
+from typing import TextIO
+from phase0.FA_class import DFA, CompactDFA
 
 
-def visualize(json_fa: str) -> None:
+def load(fa: str | DFA | CompactDFA) -> tuple[CompactDFA, list[str]]:
+    # the automaton as a table plus the display name of every row
+    if isinstance(fa, str):
+        fa_dict = json.loads(fa)
+        return CompactDFA.from_json_items(fa_dict.items()), list(fa_dict['states'])
+    if isinstance(fa, CompactDFA):
+        return fa, [f"q_{row}" for row in range(len(fa.table))]
+    return CompactDFA.from_dfa(fa), [f"q_{state.id}" for state in fa.states]
+
+
+class Layout:
+    # the part of an automaton that gets drawn: states grouped by their breadth-first depth
+    # from the initial state, parallel edges merged into one edge with a label set, and
+    # edges into sinks (states that loop on every symbol) folded into their source
+    def __init__(self, fa: str | DFA | CompactDFA, max_depth: int | None = None, around: str | int | None = None,
+                 radius: int = 1, collapse_sinks: bool = True) -> None:
+        self.fa, self.names = load(fa)
+        table = self.fa.table.tolist()
+        alphabet = self.fa.alphabet
+        init = self.fa.init_index
+        self.sinks = {row for row, next_rows in enumerate(table) if all(next_row == row for next_row in next_rows)}
+
+        self.depth = {init: 0}
+        order = [init]
+        for row in order:
+            for next_row in table[row]:
+                if next_row not in self.depth:
+                    self.depth[next_row] = self.depth[row] + 1
+                    order.append(next_row)
+
+        if around is not None:
+            order = self._neighbourhood(table, self._row(around), radius)
+        if max_depth is not None:
+            order = [row for row in order if self.depth[row] <= max_depth]
+        if collapse_sinks:
+            order = [row for row in order if row not in self.sinks or row == init]
+        visible = set(order)
+        self.visible = visible
+
+        self.levels: dict[int, list[int]] = {}
+        for row in order:
+            self.levels.setdefault(self.depth[row], []).append(row)
+        self.edges: dict[tuple[int, int], list[str]] = {}
+        self.folded: dict[int, dict[int, list[str]]] = {}
+        for row in order:
+            for symbol, next_row in zip(alphabet, table[row]):
+                if collapse_sinks and next_row in self.sinks and next_row != row:
+                    self.folded.setdefault(row, {}).setdefault(next_row, []).append(symbol)
+                elif next_row in visible:
+                    self.edges.setdefault((row, next_row), []).append(symbol)
+
+    def _row(self, state: str | int) -> int:
+        if isinstance(state, int):
+            return state
+        return self.names.index(state)
+
+    def _neighbourhood(self, table: list[list[int]], center: int, radius: int) -> list[int]:
+        # states within `radius` transitions of the center, in either direction
+        previous: dict[int, list[int]] = {}
+        for row, next_rows in enumerate(table):
+            for next_row in set(next_rows):
+                previous.setdefault(next_row, []).append(row)
+        distance = {center: 0}
+        queue = [center]
+        for row in queue:
+            if distance[row] == radius:
+                continue
+            for other in table[row] + previous.get(row, []):
+                if other not in distance:
+                    distance[other] = distance[row] + 1
+                    queue.append(other)
+        return sorted((row for row in distance if row in self.depth), key=lambda row: (self.depth[row], row))
+
+    def sink_name(self, row: int) -> str:
+        return "■" if self.fa.final_mask[row] else "□"
+
+    def folded_label(self, row: int) -> str:
+        return " ".join(f"{','.join(symbols)}→{self.sink_name(sink)}"
+                        for sink, symbols in self.folded.get(row, {}).items())
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def iter_dot(fa: str | DFA | CompactDFA, **options) -> Iterator[str]:
+    layout = Layout(fa, **options)
+    yield "digraph FA {\n"
+    yield "  rankdir=TB;\n  node [shape=circle];\n"
+    # a neighbourhood (around=) may leave the initial state out, and then has no start arrow
+    if layout.fa.init_index in layout.visible:
+        yield f"  __start [shape=point];\n  __start -> {_quote(layout.names[layout.fa.init_index])};\n"
+    for level, rows in layout.levels.items():
+        yield "  { rank=same;\n"
+        for row in rows:
+            label = layout.names[row]
+            if row in layout.folded:
+                label += "\n" + layout.folded_label(row)
+            shape = ", shape=doublecircle" if layout.fa.final_mask[row] else ""
+            yield f"    {_quote(layout.names[row])} [label={_quote(label)}{shape}];\n"
+        yield "  }\n"
+    for (row, next_row), symbols in layout.edges.items():
+        yield (f"  {_quote(layout.names[row])} -> {_quote(layout.names[next_row])} "
+               f"[label={_quote(','.join(symbols))}];\n")
+    yield "}\n"
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def iter_svg(fa: str | DFA | CompactDFA, spacing: int = 70, level_height: int = 110, node_radius: int = 20,
+             **options) -> Iterator[str]:
+    # every level is a centred row of states, so the layout is linear in states and edges
+    layout = Layout(fa, **options)
+    widest = max((len(rows) for rows in layout.levels.values()), default=1)
+    width = widest * spacing + 2 * spacing
+    height = (max(layout.levels, default=0) + 1) * level_height + level_height
+    position = {}
+    for level, rows in layout.levels.items():
+        left = (width - (len(rows) - 1) * spacing) / 2
+        for i, row in enumerate(rows):
+            position[row] = (left + i * spacing, level_height * (level + 0.5) + node_radius)
+
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+           f'font-family="sans-serif" font-size="11">\n')
+    yield ('<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="6" markerHeight="6" '
+           'orient="auto-start-reverse"><path d="M 0 0 L 10 5 L 0 10 z" fill="gray"/></marker></defs>\n')
+    if layout.fa.init_index in position:
+        x, y = position[layout.fa.init_index]
+        yield (f'<line x1="{x:.1f}" y1="{y - 2.5 * node_radius:.1f}" x2="{x:.1f}" y2="{y - node_radius:.1f}" '
+               f'stroke="black" marker-end="url(#arrow)"/>\n')
+    for (row, next_row), symbols in layout.edges.items():
+        label = _escape(','.join(symbols))
+        (x1, y1), (x2, y2) = position[row], position[next_row]
+        if row == next_row:
+            yield (f'<path d="M {x1 - 8:.1f} {y1 - node_radius + 2:.1f} C {x1 - 25:.1f} {y1 - 2.5 * node_radius:.1f} '
+                   f'{x1 + 25:.1f} {y1 - 2.5 * node_radius:.1f} {x1 + 8:.1f} {y1 - node_radius + 2:.1f}" fill="none" '
+                   f'stroke="gray" marker-end="url(#arrow)"/>\n')
+            yield f'<text x="{x1:.1f}" y="{y1 - 2.2 * node_radius:.1f}" text-anchor="middle">{label}</text>\n'
+            continue
+        dx, dy = x2 - x1, y2 - y1
+        length = max((dx * dx + dy * dy) ** 0.5, 1.0)
+        ux, uy = dx / length, dy / length
+        yield (f'<line x1="{x1 + ux * node_radius:.1f}" y1="{y1 + uy * node_radius:.1f}" '
+               f'x2="{x2 - ux * node_radius:.1f}" y2="{y2 - uy * node_radius:.1f}" stroke="gray" '
+               f'marker-end="url(#arrow)"/>\n')
+        yield f'<text x="{(x1 + x2) / 2:.1f}" y="{(y1 + y2) / 2 - 3:.1f}" text-anchor="middle">{label}</text>\n'
+    for row, (x, y) in position.items():
+        yield f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{node_radius}" fill="lightblue" stroke="black"/>\n'
+        if layout.fa.final_mask[row]:
+            yield f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{node_radius - 4}" fill="none" stroke="black"/>\n'
+        yield f'<text x="{x:.1f}" y="{y + 4:.1f}" text-anchor="middle">{_escape(layout.names[row])}</text>\n'
+        if row in layout.folded:
+            yield (f'<text x="{x:.1f}" y="{y + node_radius + 12:.1f}" text-anchor="middle" '
+                   f'fill="dimgray">{_escape(layout.folded_label(row))}</text>\n')
+    yield '</svg>\n'
+
+
+FORMATS = {".dot": iter_dot, ".gv": iter_dot, ".svg": iter_svg}
+
+
+def render(fa: str | DFA | CompactDFA, output: str | TextIO, format: str = "svg", **options) -> None:
+    # streams DOT or SVG to a path (format taken from its extension) or an open text file
+    if isinstance(output, str):
+        writer = FORMATS.get(os.path.splitext(output)[1].lower())
+        if writer is None:
+            raise ValueError(f"unsupported output {output}, expected one of {sorted(FORMATS)}")
+        with open(output, 'w', encoding='utf-8') as file:
+            file.writelines(writer(fa, **options))
+        return
+    output.writelines(FORMATS["." + format](fa, **options))
+
+
+def visualize(json_fa: str, output: str = 'temp.png', show: bool = True, **options) -> None:
+    # .dot and .svg outputs are written headlessly; anything else is drawn with matplotlib
+    if os.path.splitext(output)[1].lower() in FORMATS:
+        render(json_fa, output, **options)
+        return
+
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    layout = Layout(json_fa, **{'collapse_sinks': False, **options})
     # Create a graph
     G = nx.DiGraph()
-    # Add some nodes and edges
-    fa_dict = json.loads(json_fa)
-
-    for state in fa_dict['states']:
-        if state in fa_dict['final_states'] and state == fa_dict['initial_state']:
-            G.add_node(state, label='init state - final state')
-        elif state == fa_dict['initial_state']:
-            G.add_node(state, label='init state')
-        elif state in fa_dict['final_states']:
-            G.add_node(state, label='final state')
-        else:
-            G.add_node(state, label=state)
+    init_row = layout.fa.init_index
+    for rows in layout.levels.values():
+        for row in rows:
+            state = layout.names[row]
+            final = layout.fa.final_mask[row]
+            if final and row == init_row:
+                G.add_node(state, label='init state - final state')
+            elif row == init_row:
+                G.add_node(state, label='init state')
+            elif final:
+                G.add_node(state, label='final state')
+            else:
+                G.add_node(state, label=state)
 
     edges: dict[tuple[str, str], list[str]] = {}
-    for node in fa_dict['states']:
-        for symbol, neigh in fa_dict[node].items():
-            if (node, neigh) not in edges.keys():
-                G.add_edge(node, neigh)
-                edges[(node, neigh)] = []
-            edges[(node, neigh)].append(symbol)
+    for (row, next_row), symbols in layout.edges.items():
+        G.add_edge(layout.names[row], layout.names[next_row])
+        edges[(layout.names[row], layout.names[next_row])] = symbols
 
-    # Define node positions
-    pos = nx.circular_layout(G)
+    # Define node positions: one row per breadth-first level
+    pos = {}
+    for level, rows in layout.levels.items():
+        for i, row in enumerate(rows):
+            pos[layout.names[row]] = (i - (len(rows) - 1) / 2, -level)
 
     # Draw the graph
     plt.figure(figsize=(8, 6))  # Create a figure with a specified size
     ax = plt.gca()  # Get the current Axes instance on the current figure
-    cf = ax.get_figure()
     nx.draw(
         G,
         pos,
@@ -51,12 +236,13 @@ def visualize(json_fa: str) -> None:
                                  font_size=12,
                                  rotate=False,
                                  )
-    # cf.set_facecolor('lightgreen')
 
     # If you want to remove the axes
     ax.set_axis_off()
-    plt.savefig(fname='temp.png')
-    plt.show()  # Display the figure
+    plt.savefig(fname=output)
+    if show:
+        plt.show()  # Display the figure
+    plt.close()
 
 
 if __name__ == "__main__":